@@ -0,0 +1,109 @@
+from typing import Dict, Sequence, Tuple
+
+from referee.game import PlayerColor
+from referee.game.constants import BOARD_N
+from referee.game.bitboard import BOARD_CELLS
+from referee.game.placement_matrices import COVER_MATRIX, NEIGHBOUR_MATRIX
+
+from .board_utils import Board
+from .evaluation import FEATURES, THREAT_EMPTY_SQUARES
+
+# numpy is optional, without it leaves are evaluated one at a time
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+
+# (boards, cells) 0/1 array of the squares set in each mask
+def masks_to_array(masks: Sequence[int]):
+    data = b''.join(mask.to_bytes(16, 'little') for mask in masks)
+    bytes_array = np.frombuffer(data, dtype=np.uint8).reshape(len(masks), 16)
+
+    return np.unpackbits(bytes_array, axis=1, bitorder='little')[:, :BOARD_CELLS].astype(np.float32)
+
+
+# number of valid placements for the player holding own on each board
+def count_placements(occupied, own):
+    fits = (occupied @ COVER_MATRIX) == 0
+    touches = (own @ NEIGHBOUR_MATRIX) > 0
+
+    # any placement is valid on a player's first turn
+    first_turn = own.sum(axis=1) == 0
+    touches[first_turn] = True
+
+    return (fits & touches).sum(axis=1)
+
+
+# empty squares next to the player holding own on each board
+def frontier_size(occupied, own):
+    grid = own.reshape(-1, BOARD_N, BOARD_N)
+    neighbours = (np.roll(grid, 1, axis=1) + np.roll(grid, -1, axis=1)
+                  + np.roll(grid, 1, axis=2) + np.roll(grid, -1, axis=2)) > 0
+
+    return (neighbours.reshape(-1, BOARD_CELLS) & (occupied == 0)).sum(axis=1)
+
+
+# tokens in rows and columns close to being cleared, blue's minus red's
+def threatened_lines(occupied, red, blue):
+    grid = occupied.reshape(-1, BOARD_N, BOARD_N)
+    difference = (blue - red).reshape(-1, BOARD_N, BOARD_N)
+    threshold = BOARD_N - THREAT_EMPTY_SQUARES
+
+    rows = grid.sum(axis=2) >= threshold
+    cols = grid.sum(axis=1) >= threshold
+
+    return ((difference.sum(axis=2) * rows).sum(axis=1)
+            + (difference.sum(axis=1) * cols).sum(axis=1))
+
+
+# evaluate many positions at once, each given as its (red, blue) masks with
+# color to move. scores match evaluation.evaluate
+def evaluate_batch(positions: Sequence[Tuple[int, int]], color: PlayerColor):
+    red = masks_to_array([red for red, _ in positions])
+    blue = masks_to_array([blue for _, blue in positions])
+    occupied = red + blue
+    weights: Dict[str, float] = {name: weight for name, _, weight in FEATURES}
+
+    red_moves = count_placements(occupied, red)
+    blue_moves = count_placements(occupied, blue)
+    scores = np.zeros(len(positions), dtype=np.float64)
+
+    if weights['mobility']:
+        scores += weights['mobility'] * (red_moves - blue_moves)
+
+    if weights['tokens']:
+        scores += weights['tokens'] * (red.sum(axis=1) - blue.sum(axis=1))
+
+    if weights['frontier']:
+        scores += weights['frontier'] * (frontier_size(occupied, red) - frontier_size(occupied, blue))
+
+    if weights['threatened lines']:
+        scores += weights['threatened lines'] * threatened_lines(occupied, red, blue)
+
+    # the player to move has lost if they have no moves
+    if color == PlayerColor.RED:
+        scores[red_moves == 0] = float('-inf')
+    else:
+        scores[blue_moves == 0] = float('inf')
+
+    return scores
+
+
+def evaluate_boards(boards: Sequence[Board], color: PlayerColor):
+    return evaluate_batch([(board.bits[0], board.bits[1]) for board in boards], color)
+
+
+# evaluate the position after each of placements is played by color, with the
+# opponent to move
+def evaluate_children(board: Board, color: PlayerColor, placements: list):
+    positions = []
+
+    for placement in placements:
+        board.push(placement.action, color)
+        positions.append((board.bits[0], board.bits[1]))
+        board.pop()
+
+    return evaluate_batch(positions, color.opponent)
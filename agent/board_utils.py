@@ -1,15 +1,42 @@
-import copy
-from typing import List
+from typing import List, Optional, Tuple
 
 from referee.game import PlaceAction
 from referee.game.coord import Coord
 from referee.game.player import PlayerColor
 from referee.game.constants import BOARD_N
+from referee.game.bitboard import FULL_MASK, ROW_MASKS, COL_MASKS, NEIGHBOUR_MASKS, cell_bit, coords_mask, \
+    iter_indices, iter_coords
+from referee.game.placements import Placement, PLACEMENTS_COVERING
 
 
 class Board:
-    def __init__(self, board: dict):
+    def __init__(self, board: dict, state: Optional[Tuple[List[int], ...]] = None):
         self.board = board
+        # bitmasks (see referee.game.bitboard) of the squares each colour holds
+        # and of the empty squares next to them (the frontier), indexed by
+        # colour, and the number of squares filled in each row and column.
+        # all are kept up to date by push and pop
+        if state:
+            self.bits, self.frontier, self.rows, self.cols = state
+        else:
+            self.bits = [0, 0]
+            self.rows = [0] * BOARD_N
+            self.cols = [0] * BOARD_N
+
+            for coord, color in board.items():
+                self.bits[color] |= cell_bit(coord)
+                self.rows[coord.r] += 1
+                self.cols[coord.c] += 1
+
+            self.frontier = [0, 0]
+            self.update_frontier(FULL_MASK)
+
+        # (placement, color, cleared squares, previous masks and counters) for
+        # each move played with push
+        self.history = []
+
+    def copy(self) -> 'Board':
+        return Board(dict(self.board), (self.bits, self.frontier, self.rows, self.cols))
 
     # return all blank coords
     def blank_coords(self):
@@ -34,71 +61,141 @@ class Board:
 
         return False
 
+    # number of squares filled in each row and each column (not to be
+    # modified, they are the board's own counters)
+    def line_counts(self) -> Tuple[List[int], List[int]]:
+        return self.rows, self.cols
+
     def is_first_turn(self, color: PlayerColor) -> bool:
-        for coord in self.board.keys():
-            if self.board[coord] == color:
-                return False
+        return self.bits[color] == 0
+
+    # key identifying this position with color to move, for the
+    # transposition table
+    def key(self, color: PlayerColor) -> Tuple[int, int, int]:
+        return self.bits[0], self.bits[1], color.value
+
+    # recompute the frontier for the changed squares and their neighbours,
+    # the only squares whose frontier membership can have changed
+    def update_frontier(self, changed: int) -> None:
+        region = changed
+        for index in iter_indices(changed):
+            region |= NEIGHBOUR_MASKS[index]
+
+        empty = ~(self.bits[0] | self.bits[1])
+        frontier = list(self.frontier)
+
+        for color in range(2):
+            bits = self.bits[color]
+            color_frontier = frontier[color] & ~region
+
+            for index in iter_indices(region & empty):
+                if NEIGHBOUR_MASKS[index] & bits:
+                    color_frontier |= 1 << index
+
+            frontier[color] = color_frontier
+
+        self.frontier = frontier
+
+    # every valid placement for color, found by only trying placements that
+    # cover a frontier square. each placement appears once
+    def legal_placements(self, color: PlayerColor) -> List[Placement]:
+        occupied = self.bits[0] | self.bits[1]
+        anchors = self.frontier[color]
 
-        return True
+        # any placement is valid on a player's first turn
+        if self.bits[color] == 0:
+            anchors = FULL_MASK & ~occupied
+
+        seen = set()
+        placements = []
+
+        for index in iter_indices(anchors):
+            for placement in PLACEMENTS_COVERING[index]:
+                if placement.mask & occupied == 0 and placement.mask not in seen:
+                    seen.add(placement.mask)
+                    placements.append(placement)
+
+        return placements
 
     # returns true if a placement is valid
     def is_place_valid(self, place: PlaceAction, color: PlayerColor) -> bool:
-        is_adjacent = False
+        is_adjacent = self.is_first_turn(color)
 
         for coord in place.coords:
             # not a valid placement if there is already a square here
             if coord in self.board.keys():
                 return False
 
-            if self.adjacent_to_player(coord, color) or self.is_first_turn(color):
+            if not is_adjacent and self.adjacent_to_player(coord, color):
                 is_adjacent = True
 
         return is_adjacent
 
-    def clear_full_lines(self) -> None:
-        full_rows = []
-        full_cols = []
-        keys = self.board.keys()
+    # removes full rows and columns, returning the squares that were cleared.
+    # only the rows and columns placement touched can have been filled
+    def clear_full_lines(self, placement: PlaceAction) -> dict:
+        full_lines = 0
 
-        # get full rows
-        for i in range(BOARD_N):
-            row_full = True
-
-            for j in range(BOARD_N):
-                if Coord(i, j) not in keys:
-                    row_full = False
-                    break
+        for coord in placement.coords:
+            if self.rows[coord.r] == BOARD_N:
+                full_lines |= ROW_MASKS[coord.r]
 
-            if row_full:
-                full_rows.append(i)
+            if self.cols[coord.c] == BOARD_N:
+                full_lines |= COL_MASKS[coord.c]
 
-        # get full columns
-        for i in range(BOARD_N):
-            col_full = True
+        cleared = {}
 
-            for j in range(BOARD_N):
-                if Coord(j, i) not in keys:
-                    col_full = False
-                    break
+        if full_lines:
+            for coord in iter_coords(full_lines):
+                color = self.board.pop(coord)
+                cleared[coord] = color
+                self.rows[coord.r] -= 1
+                self.cols[coord.c] -= 1
 
-            if col_full:
-                full_cols.append(i)
+        return cleared
 
-        # create new board without full rows and columns
-        new_board = {}
+    # play a move in place, recording the squares placed and cleared so that
+    # pop can undo it (see referee.game.Board.undo_action)
+    def push(self, placement: PlaceAction, color: PlayerColor) -> None:
+        prev_state = (self.bits, self.frontier, self.rows, self.cols)
+        self.rows = list(self.rows)
+        self.cols = list(self.cols)
 
-        for coord in keys:
-            if coord.r not in full_rows and coord.c not in full_cols:
-                new_board[coord] = self.board[coord]
+        for coord in placement.coords:
+            self.board[coord] = color
+            self.rows[coord.r] += 1
+            self.cols[coord.c] += 1
+
+        cleared = self.clear_full_lines(placement)
+        self.update_masks(placement, color, cleared)
+        self.history.append((placement, color, cleared, prev_state))
+
+    # update the colour masks and frontier for a move played with push
+    def update_masks(self, placement: PlaceAction, color: PlayerColor, cleared: dict) -> None:
+        placed = coords_mask(placement.coords)
+        cleared_mask = coords_mask(cleared)
+
+        self.bits = list(self.bits)
+        self.bits[color] |= placed
+        self.bits[0] &= ~cleared_mask
+        self.bits[1] &= ~cleared_mask
+        self.update_frontier(placed | cleared_mask)
+
+    # undo the last move played with push
+    def pop(self) -> PlaceAction:
+        placement, color, cleared, prev_state = self.history.pop()
+        self.bits, self.frontier, self.rows, self.cols = prev_state
+
+        # cleared squares include any of the placed squares in a full line
+        self.board.update(cleared)
+        for coord in placement.coords:
+            del self.board[coord]
 
-        self.board = new_board
+        return placement
 
     def play_move(self, placement: PlaceAction, color: PlayerColor) -> 'Board':
-        new_board = copy.deepcopy(self)
-        for coord in placement.coords:
-            new_board.board[coord] = color
-
-        new_board.clear_full_lines()
+        new_board = self.copy()
+        new_board.push(placement, color)
 
         return new_board
 
@@ -1,10 +1,120 @@
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
 from referee.game import PlayerColor
+from referee.game.constants import BOARD_N
+from referee.game.bitboard import FULL_MASK, ROW_MASKS, COL_MASKS, iter_indices
+from referee.game.placements import PLACEMENTS_COVERING
 from .board_utils import Board
-from .node import Node
+
+# a row or column is threatened once it has few enough empty squares that
+# a single piece could clear it
+THREAT_EMPTY_SQUARES = 4
+
+# set to record how long each feature takes (see feature_timings)
+TIME_FEATURES = False
+_feature_times: Dict[str, float] = {}
+_feature_calls: Dict[str, int] = {}
+
+
+# number of valid placements for color, counted from the placement masks
+# without playing any of them
+def count_placements(board: Board, color: PlayerColor) -> int:
+    occupied = board.bits[0] | board.bits[1]
+    anchors = board.frontier[color]
+
+    # any placement is valid on a player's first turn
+    if board.bits[color] == 0:
+        anchors = FULL_MASK & ~occupied
+
+    seen = set()
+
+    for index in iter_indices(anchors):
+        for placement in PLACEMENTS_COVERING[index]:
+            if placement.mask & occupied == 0:
+                seen.add(placement.index)
+
+    return len(seen)
+
+
+def has_placement(board: Board, color: PlayerColor) -> bool:
+    occupied = board.bits[0] | board.bits[1]
+    anchors = board.frontier[color] if board.bits[color] else FULL_MASK & ~occupied
+
+    for index in iter_indices(anchors):
+        for placement in PLACEMENTS_COVERING[index]:
+            if placement.mask & occupied == 0:
+                return True
+
+    return False
+
+
+# features are all from red's point of view, red is trying to maximise eval
+# while blue is trying to minimise eval
+
+def mobility(board: Board) -> float:
+    return count_placements(board, PlayerColor.RED) - count_placements(board, PlayerColor.BLUE)
+
+
+def token_difference(board: Board) -> float:
+    return board.bits[PlayerColor.RED].bit_count() - board.bits[PlayerColor.BLUE].bit_count()
+
+
+# empty squares next to each player's tokens, a cheaper stand-in for mobility
+def frontier_size(board: Board) -> float:
+    return board.frontier[PlayerColor.RED].bit_count() - board.frontier[PlayerColor.BLUE].bit_count()
+
+
+# tokens in rows and columns that are close to being cleared, which blue
+# stands to lose more of when this is positive
+def threatened_lines(board: Board) -> float:
+    red = board.bits[PlayerColor.RED]
+    blue = board.bits[PlayerColor.BLUE]
+    occupied = red | blue
+    threatened = 0
+
+    for line in ROW_MASKS + COL_MASKS:
+        if (occupied & line).bit_count() >= BOARD_N - THREAT_EMPTY_SQUARES:
+            threatened += (blue & line).bit_count() - (red & line).bit_count()
+
+    return threatened
+
+
+# (name, feature, weight) of each feature in evaluate, features with no
+# weight are skipped
+FEATURES: List[Tuple[str, Callable[[Board], float], float]] = [
+    ('mobility', mobility, 1),
+    ('tokens', token_difference, 0.25),
+    ('frontier', frontier_size, 0),
+    ('threatened lines', threatened_lines, 0.5),
+]
 
 
 def evaluate(board: Board, color: PlayerColor) -> float:
-    node = Node(None, board, color)
-    num_valid_moves = len(node.generate_nodes())
+    # the player to move has lost if they have no moves
+    if not has_placement(board, color):
+        return float('-inf') if color == PlayerColor.RED else float('inf')
+
+    value = 0
+
+    for name, feature, weight in FEATURES:
+        if not weight:
+            continue
+
+        if TIME_FEATURES:
+            start = perf_counter()
+            value += weight * feature(board)
+            _feature_times[name] = _feature_times.get(name, 0) + perf_counter() - start
+            _feature_calls[name] = _feature_calls.get(name, 0) + 1
+        else:
+            value += weight * feature(board)
+
+    return value
+
 
-    return num_valid_moves
+# average time taken by each feature since TIME_FEATURES was set
+def feature_timings() -> str:
+    return ', '.join(
+        f"{name}: {_feature_times[name] / _feature_calls[name] * 1e6:.1f}us"
+        for name in _feature_times
+    )
@@ -2,7 +2,6 @@ import random
 from typing import Optional, List
 
 from .board_utils import Board
-from .tetromino import all_permutations
 from referee.game import PlaceAction, PlayerColor
 
 
@@ -20,21 +19,14 @@ class Node:
 
         return Node(placement, new_board, self.color)
 
-    def generate_nodes(self) -> List['Node']:
-        all_pieces = all_permutations()
-        valid_placements = set()
-
-        for piece in all_pieces:
-            for coord in self.board.blank_coords():
-                moved_piece = piece.move_to_coord(coord).coords
-                placement = PlaceAction(moved_piece[0], moved_piece[1], moved_piece[2], moved_piece[3])
-
-                if self.board.is_place_valid(placement, self.color):
-                    valid_placements.add(placement)
+    # all valid placements for this node's colour, without playing them
+    def generate_placements(self) -> List[PlaceAction]:
+        return [placement.action for placement in self.board.legal_placements(self.color)]
 
+    def generate_nodes(self) -> List['Node']:
         nodes = []
 
-        for placement in valid_placements:
+        for placement in self.generate_placements():
             nodes.append(self.play_move(placement))
 
         return nodes
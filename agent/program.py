@@ -18,6 +18,8 @@ class Agent:
         """
         self.color = color
         self.board = Board({})
+        # turns played by both players so far
+        self.turn_count = 0
 
     def action(self, **referee: dict) -> Action:
         """
@@ -29,7 +31,7 @@ class Agent:
         # the agent is playing as BLUE or RED. Obviously this won't work beyond
         # the initial moves of the game, so you should use some game playing
         # technique(s) to determine the best action to take.
-        return search(self.board, self.color)
+        return search(self.board, self.color, referee.get('time_remaining', None), self.turn_count)
 
     def update(self, color: PlayerColor, action: Action, **referee: dict):
         """
@@ -40,3 +42,4 @@ class Agent:
         # There is only one action type, PlaceAction
         place_action: PlaceAction = action
         self.board = self.board.play_move(place_action, color)
+        self.turn_count += 1
@@ -1,22 +1,71 @@
-import random
+from time import time
+from typing import List, Optional, Tuple
 
 from referee.game.actions import PlaceAction
 from referee.game.player import PlayerColor
-from referee.game.constants import BOARD_N
+from referee.game.constants import BOARD_N, MAX_TURNS
 from referee.game.coord import Coord
+from referee.game.placements import Placement
 
-from .node import Node
 from .board_utils import Board
 from .evaluation import evaluate
+from .batch_evaluation import NUMPY_AVAILABLE, evaluate_children
+from .transposition import SearchTables, EXACT, LOWER_BOUND, UPPER_BOUND
 
-MAX_DEPTH = 2
+# deepest search tried by iterative deepening
+MAX_DEPTH = 8
+# share of the time left for each of our remaining moves that a turn may use,
+# and the most any one turn may use (in seconds)
+TIME_SAFETY_FACTOR = 0.8
+MAX_TURN_TIME = 10.0
+# time per turn when the referee doesn't give a time limit
+DEFAULT_TURN_TIME = 2.0
+# evaluate all the leaves below a node in one batch (needs numpy)
+BATCH_LEAVES = NUMPY_AVAILABLE
+# print the search stats after each move
+DEBUG = False
 
 
-def search(board: Board, color: PlayerColor) -> PlaceAction:
-    # set up priority queue
-    root = Node(None, board, color)
-    moves = []
+# raised inside minimax when the turn's deadline passes
+class SearchTimeout(Exception):
+    pass
 
+
+# counts of the work done by a search, printed after each move when DEBUG is set
+class SearchStats:
+    def __init__(self, deadline: float = float('inf')):
+        self.start_time = time()
+        self.deadline = deadline
+        self.tables = SearchTables(MAX_DEPTH + 1)
+        self.nodes = 0
+        # deepest search completed before the deadline
+        self.depth = -1
+        # nodes whose children were searched, and how many of those stopped
+        # early on an alpha-beta cutoff
+        self.expanded = 0
+        self.cutoffs = 0
+
+    def __str__(self):
+        elapsed = max(time() - self.start_time, 1e-9)
+        prune_rate = self.cutoffs / self.expanded if self.expanded else 0.0
+
+        return (f"depth {self.depth}, {self.nodes} nodes in {elapsed:.2f}s ({self.nodes / elapsed:.0f} nodes/sec), "
+                f"{prune_rate * 100:.1f}% of {self.expanded} expanded nodes pruned, "
+                f"{self.tables.hit_rate() * 100:.1f}% tt hit rate")
+
+
+# seconds to spend on this turn, an even share of the time left over the moves
+# we can still expect to play
+def turn_budget(time_remaining: Optional[float], turn_count: int) -> float:
+    if not time_remaining:
+        return DEFAULT_TURN_TIME
+
+    moves_left = max(1, (MAX_TURNS - turn_count + 1) // 2)
+    return min(MAX_TURN_TIME, TIME_SAFETY_FACTOR * time_remaining / moves_left)
+
+
+def search(board: Board, color: PlayerColor, time_remaining: Optional[float] = None,
+           turn_count: int = 0) -> PlaceAction:
     if len(board.board.keys()) == 0:
         return PlaceAction(
             Coord(0, 0),
@@ -32,52 +81,226 @@ def search(board: Board, color: PlayerColor) -> PlaceAction:
             Coord(5, 5)
         )
 
-    child_nodes = root.generate_nodes()
-    if len(child_nodes) > 0:
-        return random.choice(child_nodes).placement
+    stats = SearchStats(time() + turn_budget(time_remaining, turn_count))
+    placements = ordered_placements(board, color)
+    best_move = placements[0]
 
-    for node in child_nodes:
-        move = (minimax(node, MAX_DEPTH, color), node)
-        moves.append(move)
+    # iterative deepening, keeping the best move of the deepest search that
+    # finished before the deadline
+    for depth in range(MAX_DEPTH + 1):
+        try:
+            best_move, value = search_root(board, color, placements, depth, stats)
+        except SearchTimeout:
+            break
 
-    moves.sort()
-    print(moves[0])
+        stats.depth = depth
 
-    if color == PlayerColor.RED:
-        return moves[-1][1].placement
+        # the result is decided, searching deeper won't change it
+        if value in (float('inf'), float('-inf')):
+            break
+
+        # search the best move first at the next depth
+        placements.remove(best_move)
+        placements.insert(0, best_move)
+
+    if DEBUG:
+        print(stats)
+
+    return best_move.action
+
+
+# search every move from the root to depth, returning the best placement for
+# color and its value
+def search_root(board: Board, color: PlayerColor, placements: List[Placement], depth: int,
+                stats: SearchStats) -> Tuple[Placement, float]:
+    best_move = placements[0]
+    alpha = float('-inf')
+    beta = float('inf')
+    leaf_values = leaf_batch(board, color, placements, depth + 1, stats)
+
+    for i, placement in enumerate(placements):
+        if leaf_values:
+            value = leaf_values[i]
+        else:
+            board.push(placement.action, color)
+
+            try:
+                value = minimax(board, depth, color.opponent, alpha, beta, stats, 1)
+            finally:
+                board.pop()
+
+        # red is maximising, blue is minimising
+        if color == PlayerColor.RED and value > alpha:
+            alpha = value
+            best_move = placement
+        elif color == PlayerColor.BLUE and value < beta:
+            beta = value
+            best_move = placement
+
+    return best_move, alpha if color == PlayerColor.RED else beta
+
+
+# valid placements for color, the ones most likely to be good first so that
+# alpha-beta can prune more. the best move stored in the transposition table
+# comes first, then the killer moves at this ply, then placements by their
+# history score. otherwise a placement is preferred when it takes squares the
+# opponent could have played next to, then when it fills rows and columns
+# that are close to being cleared
+def ordered_placements(board: Board, color: PlayerColor, tables: Optional[SearchTables] = None,
+                       ply: int = 0, best_move: int = -1) -> List[Placement]:
+    placements = board.legal_placements(color)
+    opponent_frontier = board.frontier[color.opponent]
+    rows, cols = board.line_counts()
+    killers = tables.killers[ply] if tables else ()
+    history = tables.history[color] if tables else None
+
+    def score(placement: Placement) -> Tuple[int, int, int, int]:
+        blocked = (placement.mask & opponent_frontier).bit_count()
+        filled = sum(rows[coord.r] + cols[coord.c] for coord in placement.coords)
+
+        return (placement.index == best_move, placement.index in killers,
+                history[placement.index] if history else 0, blocked * 4 * BOARD_N + filled)
+
+    placements.sort(key=score, reverse=True)
+    return placements
+
+
+# when the children of a node are leaves (depth 1), evaluate those from
+# placements[start:] all at once rather than as each is reached. returns None
+# if they aren't batched
+def leaf_batch(board: Board, color: PlayerColor, placements: List[Placement], depth: int,
+               stats: SearchStats = None, start: int = 0) -> Optional[List[float]]:
+    if depth != 1 or not BATCH_LEAVES or start >= len(placements):
+        return None
 
-    return moves[0][1].placement
+    if stats:
+        stats.nodes += len(placements) - start
 
+        if time() >= stats.deadline:
+            raise SearchTimeout()
 
-# red is trying to maximise eval while blue is trying to minimise eval
-def minimax(node: Node, depth: int, color: PlayerColor, alpha=float('-inf'), beta=float('inf')) -> float:
-    child_nodes = node.generate_nodes()
+    return [None] * start + evaluate_children(board, color, placements[start:]).tolist()
 
-    if len(child_nodes) == 0:
+
+# red is trying to maximise eval while blue is trying to minimise eval.
+# moves are played in place on board and undone before returning. ply is the
+# number of moves played since the root
+def minimax(board: Board, depth: int, color: PlayerColor, alpha=float('-inf'), beta=float('inf'),
+            stats: SearchStats = None, ply: int = 0) -> float:
+    if stats:
+        stats.nodes += 1
+
+        if time() >= stats.deadline:
+            raise SearchTimeout()
+
+    # max depth reached
+    if depth == 0:
+        return evaluate(board, color)
+
+    tables = stats.tables if stats else None
+    key = board.key(color)
+    best_move = -1
+    alpha_original = alpha
+    beta_original = beta
+
+    if tables:
+        entry = tables.get(key)
+
+        if entry:
+            best_move = entry.best_move
+
+            if entry.depth >= depth:
+                if entry.bound == EXACT:
+                    return entry.value
+                elif entry.bound == LOWER_BOUND:
+                    alpha = max(alpha, entry.value)
+                else:
+                    beta = min(beta, entry.value)
+
+                if alpha >= beta:
+                    return entry.value
+
+    placements = ordered_placements(board, color, tables, ply, best_move)
+
+    if len(placements) == 0:
         if color == PlayerColor.RED:
             return float('-inf')
 
         return float('inf')
 
-    # max depth reached
-    if depth == 0:
-        return evaluate(node.board, color)
+    if stats:
+        stats.expanded += 1
+
+    best_move = placements[0].index
+    # the first child is searched on its own as it often causes a cutoff,
+    # and the rest are batched if it doesn't
+    leaf_values = None
 
     # maximise eval
     if color == PlayerColor.RED:
-        for node in child_nodes:
-            alpha = max(alpha, minimax(node, depth - 1, PlayerColor.BLUE, alpha, beta))
+        for i, placement in enumerate(placements):
+            if i == 1:
+                leaf_values = leaf_batch(board, color, placements, depth, stats, 1)
+
+            if leaf_values:
+                value = leaf_values[i]
+            else:
+                board.push(placement.action, color)
+
+                try:
+                    value = minimax(board, depth - 1, PlayerColor.BLUE, alpha, beta, stats, ply + 1)
+                finally:
+                    board.pop()
+
+            if value > alpha:
+                alpha = value
+                best_move = placement.index
 
             if alpha >= beta:
-                return beta
+                if stats:
+                    stats.cutoffs += 1
+                    tables.add_cutoff(color, ply, placement.index, depth)
+                alpha = beta
+                break
 
-        return alpha
+        value = alpha
     # minimise eval
     else:
-        for node in child_nodes:
-            beta = min(beta, minimax(node, depth - 1, PlayerColor.RED, alpha, beta))
+        for i, placement in enumerate(placements):
+            if i == 1:
+                leaf_values = leaf_batch(board, color, placements, depth, stats, 1)
+
+            if leaf_values:
+                value = leaf_values[i]
+            else:
+                board.push(placement.action, color)
+
+                try:
+                    value = minimax(board, depth - 1, PlayerColor.RED, alpha, beta, stats, ply + 1)
+                finally:
+                    board.pop()
+
+            if value < beta:
+                beta = value
+                best_move = placement.index
 
             if beta <= alpha:
-                return alpha
+                if stats:
+                    stats.cutoffs += 1
+                    tables.add_cutoff(color, ply, placement.index, depth)
+                beta = alpha
+                break
+
+        value = beta
+
+    if tables:
+        if value <= alpha_original:
+            bound = UPPER_BOUND
+        elif value >= beta_original:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+
+        tables.put(key, depth, bound, value, best_move)
 
-        return beta
+    return value
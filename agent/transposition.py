@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional, Tuple
+
+from referee.game.player import PlayerColor
+from referee.game.placements import PLACEMENTS
+
+# kinds of value stored in the transposition table. alpha-beta only finds the
+# exact value of a position when it falls inside the window, otherwise it
+# finds a lower bound (on a cutoff) or an upper bound (when no move reached
+# alpha)
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+# most positions kept in the transposition table during one search
+TT_MAX_ENTRIES = 500000
+# killer moves remembered at each ply
+KILLERS_PER_PLY = 2
+
+
+# a position stored in the transposition table
+class TTEntry:
+    __slots__ = ('depth', 'bound', 'value', 'best_move')
+
+    def __init__(self, depth: int, bound: int, value: float, best_move: int):
+        self.depth = depth
+        self.bound = bound
+        self.value = value
+        # placement index of the best move found, -1 if none
+        self.best_move = best_move
+
+
+# tables kept for the whole of one search (across the iterative deepening
+# iterations): the transposition table, killer moves (moves that caused a
+# cutoff at the same ply in another branch) and the history heuristic (how
+# often and how deep each placement has caused a cutoff)
+class SearchTables:
+    def __init__(self, max_ply: int):
+        self.entries: Dict[Tuple[int, int, int], TTEntry] = {}
+        self.killers: List[List[int]] = [[] for _ in range(max_ply + 1)]
+        self.history: List[List[int]] = [[0] * len(PLACEMENTS) for _ in PlayerColor]
+
+        self.hits = 0
+        self.lookups = 0
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[TTEntry]:
+        self.lookups += 1
+        entry = self.entries.get(key, None)
+
+        if entry:
+            self.hits += 1
+
+        return entry
+
+    # a deeper search of the same position replaces the stored one, and new
+    # positions are dropped once the table is full
+    def put(self, key: Tuple[int, int, int], depth: int, bound: int, value: float, best_move: int) -> None:
+        entry = self.entries.get(key, None)
+
+        if entry is None and len(self.entries) >= TT_MAX_ENTRIES:
+            return
+
+        if entry is None or depth >= entry.depth:
+            self.entries[key] = TTEntry(depth, bound, value, best_move)
+
+    # record a move that caused a cutoff with depth left to search
+    def add_cutoff(self, color: PlayerColor, ply: int, move: int, depth: int) -> None:
+        killers = self.killers[ply]
+
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLERS_PER_PLY:]
+
+        self.history[color][move] += depth * depth
+
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
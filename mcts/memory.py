@@ -0,0 +1,130 @@
+import gc
+from time import perf_counter, process_time
+from typing import Optional
+
+# "auto":     leave python's automatic garbage collection alone
+# "deferred": no automatic collections while searching, instead collect at the
+#             end of the turn (see GC_COLLECT_EVERY)
+# "frozen":   objects surviving until the start of the turn (mostly the search
+#             tree) are frozen so that automatic collections during the turn
+#             never rescan them. they are unfrozen at the end of the turn so
+#             dead parts of the tree can be freed
+GC_MODE = "deferred"
+# outside "auto" mode, collect at the end of every GC_COLLECT_EVERY turns
+# (0 for never), as long as more than GC_COLLECT_MIN_TIME seconds of the
+# game's time would be left. these collections count against our time. the
+# referee also collects before every call to the agent, off our clock
+GC_COLLECT_EVERY = 1
+GC_COLLECT_MIN_TIME = 1.0
+
+
+# the manager whose turn is running, if any. collections are counted against
+# it by a single callback registered once per process, so any number of agents
+# (e.g. over several games hosted by the same process) can use GCManager
+# without adding callbacks
+_active: Optional['GCManager'] = None
+_collection_start: Optional[float] = None
+
+
+def _on_collection(phase: str, info: dict) -> None:
+    global _collection_start
+
+    if phase == "start":
+        _collection_start = perf_counter()
+        return
+
+    if _collection_start is None:
+        return
+
+    elapsed = perf_counter() - _collection_start
+    _collection_start = None
+
+    if _active is not None:
+        _active.record_collection(elapsed)
+
+
+if _on_collection not in gc.callbacks:
+    gc.callbacks.append(_on_collection)
+
+
+class GCManager:
+    def __init__(self, mode: str = GC_MODE, collect_every: int = GC_COLLECT_EVERY,
+                 collect_min_time: float = GC_COLLECT_MIN_TIME):
+        if mode not in ("auto", "deferred", "frozen"):
+            raise ValueError(f"unknown gc mode: {mode}")
+
+        self.mode = mode
+        self.collect_every = collect_every
+        self.collect_min_time = collect_min_time
+        self.turns = 0
+
+        # counters for the collector during our turns, both for the last turn
+        # and in total
+        self.turn_collections = 0
+        self.turn_gc_time = 0.0
+        self.total_collections = 0
+        self.total_gc_time = 0.0
+
+        # whether automatic collection was on before the turn, restored after
+        self._was_enabled = True
+        # game time left when the turn started (None if unlimited)
+        self._time_remaining: Optional[float] = None
+        self._turn_start = 0.0
+
+    def record_collection(self, elapsed: float) -> None:
+        self.turn_collections += 1
+        self.turn_gc_time += elapsed
+        self.total_collections += 1
+        self.total_gc_time += elapsed
+
+    def start_turn(self, time_remaining: Optional[float] = None) -> None:
+        global _active
+
+        _active = self
+        self.turn_collections = 0
+        self.turn_gc_time = 0.0
+        self._was_enabled = gc.isenabled()
+        self._time_remaining = time_remaining
+        self._turn_start = process_time()
+
+        if self.mode == "deferred":
+            gc.disable()
+        elif self.mode == "frozen":
+            gc.freeze()
+
+    # whether to collect at the end of this turn
+    def should_collect(self) -> bool:
+        if self.mode == "auto" or not self.collect_every or self.turns % self.collect_every != 0:
+            return False
+
+        if self._time_remaining is None:
+            return True
+
+        time_left = self._time_remaining - (process_time() - self._turn_start)
+        return time_left > self.collect_min_time
+
+    def end_turn(self) -> None:
+        global _active
+
+        self.turns += 1
+
+        if self.mode == "frozen":
+            gc.unfreeze()
+
+        # collected while this manager is still active, so it is counted in
+        # this turn's stats
+        if self.should_collect():
+            gc.collect()
+
+        if self._was_enabled:
+            gc.enable()
+        else:
+            gc.disable()
+
+        if _active is self:
+            _active = None
+
+    def stats(self) -> str:
+        return (f"gc: {self.turn_collections} collections "
+                f"({self.turn_gc_time * 1000:.1f}ms) this turn, "
+                f"{self.total_collections} ({self.total_gc_time * 1000:.1f}ms) total")
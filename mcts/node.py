@@ -1,13 +1,15 @@
-import gc
 import random
 from typing import Optional, List
 
 from .board_utils import Board
 from .tetromino import TetrominoShape
 from referee.game import PlaceAction, PlayerColor, Coord
+from referee.game.placements import Placement
 
 
 class Node:
+    __slots__ = ('placement', 'board', 'color')
+
     def __init__(self, placement: Optional[PlaceAction], board: Board, color: PlayerColor):
         self.placement = placement
         self.board = board
@@ -26,32 +28,15 @@ class Node:
 
         return Node(placement, new_board, color)
 
-    def generate_nodes(self, pieces: List[TetrominoShape]) -> List['Node']:
-        valid_placements = set()
-        blank_coords = self.board.blank_coords()
-
-        for piece in pieces:
-            for coord in blank_coords:
-                moved_piece = piece.move_to_coord(coord).coords
-                placement = PlaceAction(moved_piece[0], moved_piece[1], moved_piece[2], moved_piece[3])
-
-                if self.board.is_place_valid(placement, self.color):
-                    valid_placements.add(placement)
-                else:
-                    del placement
-
-                del moved_piece
-
-        nodes = []
+    # every valid placement for this node's colour, each appearing once
+    def legal_placements(self) -> List[Placement]:
+        return self.board.legal_placements(self.color)
 
-        for placement in valid_placements:
-            nodes.append(self.play_move(placement))
+    def generate_nodes(self) -> List['Node']:
+        return [self.play_move(placement.action) for placement in self.legal_placements()]
 
-        del blank_coords
-        gc.collect()
-        return nodes
-
-    def random_move(self, pieces: List[TetrominoShape], coords: List[Coord]) -> Optional['Node']:
+    # find a random valid placement for color on this node's board
+    def random_move(self, pieces: List[TetrominoShape], coords: List[Coord], color: PlayerColor) -> Optional[PlaceAction]:
         pieces_len = len(pieces)
         coords_len = len(coords)
         piece_index = random.randint(0, pieces_len - 1)
@@ -64,13 +49,10 @@ class Node:
 
             while coord_count < coords_len:
                 coord = coords[coord_index]
-                moved_piece = piece.move_to_coord(coord).coords
-                placement = PlaceAction(moved_piece[0], moved_piece[1], moved_piece[2], moved_piece[3])
+                placement = piece.placement_at(coord).action
 
-                if self.board.is_place_valid(placement, self.color):
-                    new_move = self.play_move(placement)
-                    del self
-                    return new_move
+                if self.board.is_place_valid(placement, color):
+                    return placement
 
                 coord_index = coord_index + 1 if coord_index != coords_len - 1 else 0
                 coord_count += 1
@@ -78,20 +60,34 @@ class Node:
             piece_index = piece_index + 1 if piece_index != pieces_len - 1 else 0
             piece_count += 1
 
-        del self
         return None
 
-    # random playout from a given node, returns if this node won
-    def playout(self, pieces: List[TetrominoShape]) -> PlayerColor:
+    # random playout from a given node, returns the colour left without a move,
+    # or if the turn limit is reached first the one with fewer tokens (None
+    # for a draw). moves are played in place on this node's board and undone
+    # afterwards
+    def playout(self, pieces: List[TetrominoShape]) -> Optional[PlayerColor]:
         random.shuffle(pieces)
         coords = self.board.blank_coords()
         random.shuffle(coords)
-        node = self
-        random_move = node.random_move(pieces, coords)
+        color = self.color
+        turns_left = self.board.turns_left()
+        moves_played = 0
+
+        while moves_played < turns_left:
+            random_move = self.random_move(pieces, coords, color)
+
+            if not random_move:
+                break
+
+            self.board.push(random_move, color)
+            moves_played += 1
+            color = color.opponent
+
+        loser = color if moves_played < turns_left else self.board.turn_limit_loser()
 
-        while random_move:
-            node = random_move
-            random_move = random_move.random_move(pieces, coords)
+        for _ in range(moves_played):
+            self.board.pop()
 
         del coords
-        return node.color
+        return loser
@@ -0,0 +1,87 @@
+import random
+from concurrent.futures import ProcessPoolExecutor, Future
+from time import time
+from typing import Dict, List, Tuple
+
+from referee.game import PlayerColor
+
+from . import playout
+from .board_utils import Board
+from .search import simulate
+from .tetromino import all_permutations
+from .tree import Tree, TreeNode
+
+# number of extra processes searching alongside the agent each turn, each
+# growing an independent tree from the same root (0 to search in-process only)
+MCTS_WORKERS = 0
+
+# pieces used by searches in a worker process, built once per process
+_worker_pieces = None
+
+
+def _warm_up() -> None:
+    global _worker_pieces
+
+    if _worker_pieces is None:
+        _worker_pieces = all_permutations()
+
+
+# search from board in a worker process, returning the (playouts, wins) of
+# each move from the root, keyed by placement index
+def _worker_search(board: Board, color: PlayerColor, seed: int, deadline: float) -> Dict[int, Tuple[int, int]]:
+    _warm_up()
+    random.seed(seed)
+    playout.seed(seed)
+
+    tree = Tree()
+    root_tree_node = tree.set_root(board, color)
+    root_tree_node.expand(board, tree)
+    simulate(root_tree_node, board, tree, _worker_pieces, deadline)
+
+    return {
+        placement: (visits, wins)
+        for placement, visits, wins in zip(root_tree_node.moves, root_tree_node.visits, root_tree_node.wins)
+        if visits
+    }
+
+
+class RootParallelSearch:
+    def __init__(self, workers: int = MCTS_WORKERS):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.futures: List[Future] = []
+
+        # start the worker processes now so their startup (and imports) isn't
+        # paid for during a turn
+        for future in [self.pool.submit(_warm_up) for _ in range(workers)]:
+            future.result()
+
+    def start(self, board: Board, color: PlayerColor, time_budget: float) -> None:
+        deadline = time() + time_budget
+        seed = random.getrandbits(32)
+        root_board = board.copy()
+
+        self.futures = [
+            self.pool.submit(_worker_search, root_board, color, seed + i + 1, deadline)
+            for i in range(self.workers)
+        ]
+
+    # add the root statistics found by each worker to the local tree
+    def merge_into(self, root_tree_node: TreeNode) -> None:
+        indices = {placement: index for index, placement in enumerate(root_tree_node.moves)}
+
+        for future in self.futures:
+            for placement, (visits, wins) in future.result().items():
+                index = indices.get(placement, -1)
+
+                if index < 0:
+                    continue
+
+                root_tree_node.visits[index] += visits
+                root_tree_node.wins[index] += wins
+                root_tree_node.playouts += visits
+
+        self.futures = []
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
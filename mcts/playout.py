@@ -0,0 +1,135 @@
+from typing import List, Optional
+
+from referee.game.player import PlayerColor
+from referee.game.constants import BOARD_N
+from referee.game.bitboard import BOARD_CELLS
+from referee.game.placements import PLACEMENTS
+from referee.game.placement_matrices import COVER_MATRIX, NEIGHBOUR_MATRIX
+
+from .board_utils import Board
+
+# numpy is optional, without it the agent falls back to Node.playout
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+# cell values in the playout arrays (a colour's value is its enum value + 1)
+EMPTY = 0
+
+
+if NUMPY_AVAILABLE:
+    # (placements, 4) cells covered by each placement
+    PLACEMENT_CELLS = np.array([p.cells for p in PLACEMENTS], dtype=np.intp)
+
+    _rng = np.random.default_rng()
+
+
+def seed(value: Optional[int]) -> None:
+    global _rng
+
+    if NUMPY_AVAILABLE:
+        _rng = np.random.default_rng(value)
+
+
+def board_to_array(board: Board):
+    cells = np.zeros(BOARD_CELLS, dtype=np.int8)
+
+    for coord, color in board.board.items():
+        cells[coord.r * BOARD_N + coord.c] = color.value + 1
+
+    return cells
+
+
+# (boards, placements) mask of the valid placements on each board for the
+# player whose cell value is in player (one per board)
+def valid_placements(cells, player):
+    # a placement is valid if all of its cells are empty and at least one
+    # of its neighbours belongs to the player to move
+    occupied = (cells != EMPTY).astype(np.float32)
+    own = (cells == player[:, None]).astype(np.float32)
+
+    return ((occupied @ COVER_MATRIX) == 0) & ((own @ NEIGHBOUR_MATRIX) > 0)
+
+
+# play the chosen placement on each board for the player with the matching
+# cell value, then clear full rows and columns
+def play_placements(cells, chosen, player) -> None:
+    n = len(cells)
+    cells[np.arange(n)[:, None], PLACEMENT_CELLS[chosen]] = player[:, None]
+
+    grid = cells.reshape(n, BOARD_N, BOARD_N) != EMPTY
+    full = grid.all(axis=2)[:, :, None] | grid.all(axis=1)[:, None, :]
+    cells[full.reshape(n, BOARD_CELLS)] = EMPTY
+
+
+# score the position after each of placements (indices into PLACEMENTS) is
+# played on board by color, all at once. the score is color's number of
+# valid moves less the opponent's
+def evaluate_children(board: Board, color: PlayerColor, placements):
+    count = len(placements)
+    cells = np.tile(board_to_array(board), (count, 1))
+    player = np.full(count, color.value + 1, dtype=np.int8)
+
+    play_placements(cells, np.asarray(placements, dtype=np.intp), player)
+
+    return (valid_placements(cells, player).sum(axis=1).astype(np.float64)
+            - valid_placements(cells, 3 - player).sum(axis=1))
+
+
+# plays count random games from board with color to move, all at once. boards
+# are kept as a (count, cells) array and each step picks a random valid
+# placement for every unfinished game using vectorised validity masks. games
+# end on the real turn limit, max_moves defaults to the moves left before it.
+# returns the colour left without a move in each game, or the loser on the
+# turn limit (None for a draw), as Node.playout does
+def batch_playout(board: Board, color: PlayerColor, count: int,
+                  max_moves: Optional[int] = None) -> List[Optional[PlayerColor]]:
+    if max_moves is None:
+        max_moves = board.turns_left()
+
+    boards = np.tile(board_to_array(board), (count, 1))
+    to_move = np.full(count, color.value + 1, dtype=np.int8)
+    losers = np.zeros(count, dtype=np.int8)
+    active = np.arange(count)
+
+    for _ in range(max_moves):
+        if len(active) == 0:
+            break
+
+        cells = boards[active]
+        mover = to_move[active]
+        valid = valid_placements(cells, mover)
+
+        has_move = valid.any(axis=1)
+        finished = active[~has_move]
+        losers[finished] = to_move[finished]
+
+        if not has_move.all():
+            keep = has_move
+            active, cells, mover, valid = active[keep], cells[keep], mover[keep], valid[keep]
+
+            if len(active) == 0:
+                break
+
+        # pick a uniformly random valid placement for each game
+        scores = _rng.random(valid.shape)
+        scores[~valid] = -1.0
+        chosen = scores.argmax(axis=1)
+        play_placements(cells, chosen, mover)
+
+        boards[active] = cells
+        to_move[active] = 3 - mover
+
+    # games still going when the turn limit is reached are lost by whoever has
+    # fewer tokens, and drawn (left as EMPTY) on a tie
+    for i in active:
+        red_tokens = (boards[i] == PlayerColor.RED.value + 1).sum()
+        blue_tokens = (boards[i] == PlayerColor.BLUE.value + 1).sum()
+
+        if red_tokens != blue_tokens:
+            losers[i] = (PlayerColor.RED if red_tokens < blue_tokens else PlayerColor.BLUE).value + 1
+
+    return [PlayerColor(loser - 1) if loser != EMPTY else None for loser in losers]
@@ -1,10 +1,19 @@
 # COMP30024 Artificial Intelligence, Semester 1 2024
 # Project Part B: Game Playing Agent
+import weakref
+
 from .board_utils import Board
+
 from referee.game import PlayerColor, Action, PlaceAction, Coord
+from referee.game.placements import find_placement
 from .search import search
 from .tree import Tree
 from .tetromino import all_permutations
+from .memory import GCManager
+from .parallel import MCTS_WORKERS, RootParallelSearch
+
+# print the garbage collector's stats after every turn
+DEBUG = False
 
 
 class Agent:
@@ -20,8 +29,17 @@ class Agent:
         """
         self.color = color
         self.board = Board({})
-        self.tree = Tree()
+        self.tree = Tree(referee.get('space_limit', None))
         self.pieces = all_permutations()
+        self.gc = GCManager()
+        # kept for the whole game so the worker processes stay warm. they are
+        # shut down once the agent is discarded, when its process exits or a
+        # pooled referee process moves on to its next game. the referee only
+        # measures this process, so the workers' memory is not counted
+        # against the space limit
+        self.parallel = RootParallelSearch(MCTS_WORKERS) if MCTS_WORKERS > 0 else None
+        if self.parallel:
+            weakref.finalize(self, self.parallel.shutdown)
 
     def action(self, **referee: dict) -> Action:
         """
@@ -33,7 +51,16 @@ class Agent:
         # the agent is playing as BLUE or RED. Obviously this won't work beyond
         # the initial moves of the game, so you should use some game playing
         # technique(s) to determine the best action to take.
-        return search(self.board, self.color, self.tree, self.pieces, referee['time_remaining'])
+        self.gc.start_turn(referee['time_remaining'])
+        try:
+            action = search(self.board, self.color, self.tree, self.pieces, referee['time_remaining'], self.parallel)
+        finally:
+            self.gc.end_turn()
+
+        if DEBUG:
+            print(self.gc.stats())
+
+        return action
 
     def update(self, color: PlayerColor, action: Action, **referee: dict):
         """
@@ -44,3 +71,4 @@ class Agent:
         # There is only one action type, PlaceAction
         place_action: PlaceAction = action
         self.board = self.board.play_move(place_action, color)
+        self.tree.advance(find_placement(place_action.coords).index, self.board)
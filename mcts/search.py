@@ -1,5 +1,5 @@
 from time import time
-from typing import List
+from typing import List, Optional
 import random
 
 from referee.game.actions import PlaceAction
@@ -8,58 +8,82 @@ from referee.game.player import PlayerColor
 from .node import Node
 from .board_utils import Board
 from .tetromino import TetrominoShape
-from .tree import Tree
+from .tree import Tree, TreeNode
 
 MCTS_ITERATIONS = 1000
 
 
-def search(board: Board, color: PlayerColor, tree: Tree, pieces: List[TetrominoShape], time_remaining) -> PlaceAction:
+def search(board: Board, color: PlayerColor, tree: Tree, pieces: List[TetrominoShape], time_remaining,
+           parallel: Optional['RootParallelSearch'] = None) -> PlaceAction:
     if not time_remaining:
         time_remaining = 180
 
     turn_start_time = time()
-    root = Node(None, board, color)
-    root_tree_node = tree.get_node_from_board(board)
-
-    if not root_tree_node:
-        root_tree_node = tree.add_tree_node(root, None)
+    time_budget = min(9.0, time_remaining / 6)
+    root_tree_node = tree.set_root(board, color)
 
     if board.is_first_turn(color):
         random_piece = random.choice(pieces)
         random_coord = random.choice(board.blank_coords())
-        moved_piece = random_piece.move_to_coord(random_coord).coords
-        placement = PlaceAction(moved_piece[0], moved_piece[1], moved_piece[2], moved_piece[3])
+        return random_piece.placement_at(random_coord).action
+
+    # workers grow their own trees from this board while we grow ours
+    if parallel:
+        parallel.start(board, color, time_budget)
+
+    if not root_tree_node.expanded:
+        root_tree_node.expand(board, tree)
+
+    simulate(root_tree_node, board, tree, pieces, turn_start_time + time_budget)
+
+    if parallel:
+        parallel.merge_into(root_tree_node)
+
+    # pick the best move
+    best_index = root_tree_node.select_best_move()
+
+    # for some reason if there is only one valid move the ai will choose an invalid move
+    if best_index < 0 or not board.is_place_valid(root_tree_node.placement(best_index).action, color):
+        print('how did we get here?')
+        best_move = Node(None, board, color).generate_nodes()[0]
+        return best_move.placement
+
+    return root_tree_node.placement(best_index).action
 
-        return placement
 
-    # simulate playouts
+# run mcts iterations from root_tree_node (whose board is board) until the
+# deadline (or the iteration limit) is reached. moves are played on a single
+# copy of the board on the way down and undone after each playout
+def simulate(root_tree_node: TreeNode, board: Board, tree: Tree, pieces: List[TetrominoShape], deadline: float) -> None:
+    board = board.copy()
+
     for i in range(MCTS_ITERATIONS):
-        if time() - turn_start_time >= min(9.0, time_remaining / 6):
+        if time() >= deadline:
             break
 
         # select a node
-        tree_node = root_tree_node.select_max_child(pieces)
+        tree_node = root_tree_node
+        path = []
 
-        if not tree_node:
-            break
+        while True:
+            if not tree_node.expanded:
+                tree_node.expand(board, tree)
 
-        while tree_node.playouts != 0:
-            new_tree_node = tree_node.select_max_child(pieces)
-            if not new_tree_node:
-                break
+            index = tree_node.select_max_child()
 
-            tree_node = new_tree_node
+            if index < 0:
+                break
 
-        # playout
-        tree_node.playout(pieces)
+            visited = tree_node.visits[index] != 0
+            board.push(tree_node.placement(index).action, tree_node.color)
+            path.append((tree_node, index))
+            tree_node = tree_node.child(index, board, tree)
 
-    # pick the best move
-    best_move = root_tree_node.select_best_move()
+            if not visited:
+                break
 
-    # for some reason if there is only one valid move the ai will choose an invalid move
-    if not best_move or not board.is_place_valid(best_move.node.placement, color):
-        print('how did we get here?')
-        best_move = root_tree_node.node.generate_nodes(pieces)[0]
-        return best_move.placement
+        # playout
+        tree_node.playout(board, pieces, path)
 
-    return best_move.node.placement
+        for _ in range(len(path)):
+            board.pop()
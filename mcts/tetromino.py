@@ -2,11 +2,14 @@ from enum import Enum
 from typing import List
 
 from referee.game.coord import Coord, Vector2
+from referee.game.constants import BOARD_N
+from referee.game.placements import Placement, find_placement
 
 
 class TetrominoShape:
     def __init__(self, coords: List[Vector2]):
         self.coords = coords
+        self.placements = None
 
     # move the piece so all coords are positive
     def make_positive(self) -> None:
@@ -47,11 +50,23 @@ class TetrominoShape:
 
     # transform piece so that (0, 0) is located at new_coord
     def move_to_coord(self, new_coord):
-        new_coords = []
-        for coord in self.coords:
-            new_coords.append(coord + new_coord)
-
-        return TetrominoShape(new_coords)
+        return TetrominoShape(list(self.placement_at(new_coord).coords))
+
+    # precomputed placement of this piece with (0, 0) located at coord
+    def placement_at(self, coord: Coord) -> Placement:
+        if self.placements is None:
+            # look up the placement at every cell once, after which moving the
+            # piece is just an index into this list
+            self.placements = [
+                find_placement([
+                    Coord((r + offset.r) % BOARD_N, (c + offset.c) % BOARD_N)
+                    for offset in self.coords
+                ])
+                for r in range(BOARD_N)
+                for c in range(BOARD_N)
+            ]
+
+        return self.placements[coord.r * BOARD_N + coord.c]
 
     # transform piece so that the coord at coord_index is located at the origin
     def make_centre(self, coord_index):
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from typing import Callable, Optional
+
+# memory used by a tree node before it is expanded: the node itself, its
+# (empty) children dict, its list of parents, its hash key, and its entries in
+# this table and in its parent's children (measured with tracemalloc). an
+# expanded node also holds its child arrays, see TreeNode.size_bytes
+NODE_OVERHEAD_BYTES = 448
+
+
+# maps zobrist hashes of board states to their tree nodes. when a capacity (in
+# bytes) is given the least recently used entries are evicted to keep the
+# total size of the entries within it. entries are put with their current
+# size, and resized when they grow
+class TranspositionTable:
+    def __init__(self, capacity: Optional[int] = None,
+                 on_evict: Optional[Callable[['TreeNode'], bool]] = None):
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        self.capacity = capacity
+        # called with each evicted node, returning False if it must be kept
+        self.on_evict = on_evict
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_memory_budget(cls, budget_mb: float,
+                           on_evict: Optional[Callable[['TreeNode'], bool]] = None) -> 'TranspositionTable':
+        return cls(max(1, int(budget_mb * 1024 * 1024)), on_evict)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.entries
+
+    def get(self, key: int) -> Optional['TreeNode']:
+        tree_node = self.entries.get(key, None)
+
+        if tree_node is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return tree_node
+
+    def put(self, key: int, tree_node: 'TreeNode', size: int = NODE_OVERHEAD_BYTES) -> None:
+        self.entries[key] = tree_node
+        self.entries.move_to_end(key)
+        self.size += size - self.sizes.get(key, 0)
+        self.sizes[key] = size
+        self.shrink()
+
+    # record the new size of an entry, e.g. once its node has been expanded
+    def resize(self, key: int, size: int) -> None:
+        if key not in self.entries:
+            return
+
+        self.size += size - self.sizes[key]
+        self.sizes[key] = size
+        self.shrink()
+
+    # evict entries until the table is within its capacity
+    def shrink(self) -> None:
+        # protected entries go back to the most recently used end, so give up
+        # once every entry has been tried
+        attempts = len(self.entries)
+
+        while self.capacity is not None and self.size > self.capacity and attempts > 0:
+            self.evict()
+            attempts -= 1
+
+    # mark an entry as recently used
+    def touch(self, key: int) -> None:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+
+    # remove an entry without calling on_evict
+    def discard(self, key: int) -> None:
+        if self.entries.pop(key, None) is not None:
+            self.size -= self.sizes.pop(key)
+
+    # evict the least recently used entry, returns False if it had to be kept
+    # (in which case it becomes the most recently used)
+    def evict(self) -> bool:
+        key, tree_node = self.entries.popitem(last=False)
+
+        if self.on_evict and not self.on_evict(tree_node):
+            self.entries[key] = tree_node
+            return False
+
+        self.size -= self.sizes.pop(key)
+        self.evictions += 1
+        return True
+
+    # drop every entry not in keys
+    def retain(self, keys: set) -> None:
+        self.entries = OrderedDict(
+            (key, tree_node) for key, tree_node in self.entries.items() if key in keys
+        )
+        self.sizes = {key: self.sizes[key] for key in self.entries}
+        self.size = sum(self.sizes.values())
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.sizes.clear()
+        self.size = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> str:
+        capacity = f"{self.capacity / 2 ** 20:.1f}MB" if self.capacity is not None else "unbounded"
+        return (f"tt: {len(self)} entries in {self.size / 2 ** 20:.1f}MB/{capacity}, "
+                f"{self.hit_rate() * 100:.1f}% hit rate, {self.evictions} evictions")
@@ -1,104 +1,378 @@
 import math
+import sys
+from array import array
 
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from .board_utils import Board
 from .node import Node
 from referee.game import PlayerColor
+from referee.game.placements import PLACEMENTS, Placement
 from .tetromino import TetrominoShape
+from .transposition import TranspositionTable, NODE_OVERHEAD_BYTES
+from .playout import NUMPY_AVAILABLE, batch_playout, evaluate_children, np
 
 BALANCING_CONSTANT = 1
+# child selection rule, "ucb1" or "puct" (which weights exploration by each
+# child's prior)
+SELECTION_RULE = "ucb1"
+# memory (in MB) the transposition table may use, as a share of the referee's
+# space limit, or a fixed amount if there is no limit
+TREE_MEMORY_FRACTION = 0.5
+DEFAULT_TREE_MEMORY_MB = 125
+# random games played from each leaf per iteration, batched when numpy is
+# available (see playout.batch_playout)
+PLAYOUTS_PER_LEAF = 16 if NUMPY_AVAILABLE else 1
+# how the prior of each move is found, "lines" to favour filling nearly full
+# rows and columns or "mobility" to score every child in one batch by the
+# mover's valid moves less the opponent's (needs numpy)
+PRIOR_RULE = "lines"
+# higher values give flatter mobility priors
+PRIOR_TEMPERATURE = 4
+# with progressive widening only the children with the highest priors can be
+# selected, WIDENING_CONSTANT * playouts ** WIDENING_EXPONENT of them (and at
+# least WIDENING_MIN_CHILDREN), so more are opened as a node gets visited
+PROGRESSIVE_WIDENING = True
+WIDENING_CONSTANT = 2
+WIDENING_EXPONENT = 0.5
+WIDENING_MIN_CHILDREN = 8
 
 
 class Tree:
-    def __init__(self):
-        self.nodes = {}
+    def __init__(self, space_limit: Optional[float] = None):
+        memory_budget = space_limit * TREE_MEMORY_FRACTION if space_limit else DEFAULT_TREE_MEMORY_MB
+        self.nodes = TranspositionTable.from_memory_budget(memory_budget, self.evict)
+        self.root: Optional['TreeNode'] = None
 
-    def add_tree_node(self, node: Node, parent: Optional['TreeNode']) -> 'TreeNode':
-        transposition = self.nodes.get(node.board.board_string, None)
+    # the node for the board, which has color to move. an existing node is
+    # reused if the board is a transposition of one already in the tree, and
+    # is linked to its new parent as well as its existing ones
+    def add_tree_node(self, board: Board, color: PlayerColor, parent: Optional['TreeNode'], index: int = -1) -> 'TreeNode':
+        transposition = self.nodes.get(board.hash)
 
         if transposition:
-            self.nodes[node.board.board_string].node = node
-            return self.nodes[node.board.board_string]
+            if parent:
+                transposition.parents.append((parent, index))
 
-        new_node = TreeNode(node, parent, self, node.board.board_string)
-        self.nodes[node.board.board_string] = new_node
+            return transposition
+
+        new_node = TreeNode(board.hash, color, parent, index)
+        self.nodes.put(board.hash, new_node)
 
         return new_node
 
     def get_node_from_board(self, board: Board) -> Optional['TreeNode']:
-        return self.nodes.get(board.board_string, None)
+        return self.nodes.get(board.hash)
+
+    # make the node for board the root, reusing it (and its statistics) if it
+    # is already in the tree
+    def set_root(self, board: Board, color: PlayerColor) -> 'TreeNode':
+        if self.root and self.root.key == board.hash:
+            return self.root
+
+        root = self.add_tree_node(board, color, None)
+        self.promote(root)
+
+        return root
+
+    # called after every move played in the game, moving the root down to the
+    # child for the new board so its subtree is kept for the next search
+    def advance(self, placement: int, board: Board) -> None:
+        if not self.root or self.root.moves is None:
+            self.root = None
+            self.nodes.clear()
+            return
+
+        index = self.root.index_of(placement)
+
+        if index < 0:
+            self.root = None
+            self.nodes.clear()
+            return
+
+        new_root = self.root.children.get(index, None)
+
+        if not new_root:
+            # never descended into, but the playouts through it still count
+            new_root = TreeNode(board.hash, self.root.color.opponent, None)
+            new_root.playouts = self.root.visits[index]
+            self.nodes.clear()
+            self.nodes.put(new_root.key, new_root)
+
+        self.promote(new_root)
+
+    # make tree_node the root and drop everything not reachable from it
+    def promote(self, tree_node: 'TreeNode') -> None:
+        self.root = tree_node
+
+        reachable = {tree_node.key: tree_node}
+        stack = [tree_node]
+
+        while stack:
+            parent = stack.pop()
+
+            for child in parent.children.values():
+                if child.key not in reachable:
+                    reachable[child.key] = child
+                    stack.append(child)
+
+        # links from nodes that are no longer in the tree would keep them
+        # alive, so only links between reachable nodes are kept
+        for node in reachable.values():
+            node.parents = [(parent, index) for parent, index in node.parents if reachable.get(parent.key) is parent]
+
+        tree_node.parents = []
+        self.nodes.retain(reachable.keys())
+
+    # the root and its children are never evicted
+    def protected(self, tree_node: 'TreeNode') -> bool:
+        return tree_node is self.root or any(parent is self.root for parent, _ in tree_node.parents)
+
+    # remove every link between tree_node and its parents and children
+    def unlink(self, tree_node: 'TreeNode') -> None:
+        for parent, index in tree_node.parents:
+            if parent.children.get(index, None) is tree_node:
+                del parent.children[index]
+
+        for child in tree_node.children.values():
+            child.parents = [(parent, index) for parent, index in child.parents if parent is not tree_node]
+
+        tree_node.parents = []
+        tree_node.children = {}
+
+    # called when the transposition table evicts a node, unlinking it from
+    # every parent (a transposition may have several) so the memory can be
+    # freed. its statistics stay in the parents' arrays. descendants left
+    # without a parent are dropped with it, while those still linked from
+    # elsewhere in the tree stay
+    def evict(self, tree_node: 'TreeNode') -> bool:
+        if self.protected(tree_node):
+            return False
+
+        stack = [tree_node]
+
+        while stack:
+            node = stack.pop()
+            children = list(node.children.values())
+            self.unlink(node)
+
+            if node is not tree_node:
+                self.nodes.discard(node.key)
+
+            for child in children:
+                if not child.parents and child is not self.root:
+                    stack.append(child)
+
+        return True
+
+
+# cheap prior for each placement played by color, by default favouring
+# squares in rows and columns that are already close to being cleared
+def placement_priors(board: Board, color: PlayerColor, placements: List[Placement]) -> List[float]:
+    if PRIOR_RULE == "mobility" and NUMPY_AVAILABLE and placements:
+        scores = evaluate_children(board, color, [placement.index for placement in placements])
+        return np.exp((scores - scores.max()) / PRIOR_TEMPERATURE).tolist()
+
+    rows, cols = board.line_counts()
 
+    return [
+        1 + sum(rows[coord.r] + cols[coord.c] for coord in placement.coords)
+        for placement in placements
+    ]
 
+
+# a node of the search tree. nodes don't store a board, the board for a node
+# is built on the way down by playing the moves from the root. the statistics
+# of a node's children are kept in parallel arrays on the node itself, with
+# child nodes only created once they are descended into
 class TreeNode:
-    def __init__(self, node: Node, parent: Optional['TreeNode'], tree: Tree, board_string: str):
-        self.node = node
-        self.parent = parent
-        self.tree = tree
-        self.board_string = board_string
-        self.children = {}
+    __slots__ = ('key', 'color', 'parents', 'playouts',
+                 'moves', 'visits', 'wins', 'priors', 'children')
+
+    def __init__(self, key: int, color: PlayerColor, parent: Optional['TreeNode'], index: int = -1):
+        self.key = key
+        # colour to move at this node
+        self.color = color
+        # every (parent node, index of this node in the parent's arrays) that
+        # links to this node, more than one for a transposition
+        self.parents: List[Tuple['TreeNode', int]] = [(parent, index)] if parent else []
         self.playouts = 0
-        self.wins = 0
-        self.ucb_score = float('inf')
 
-    def ucb(self) -> float:
-        if self.playouts == 0:
+        # placement table indices of the valid moves, None until expanded
+        self.moves: Optional[array] = None
+        self.visits: Optional[array] = None
+        self.wins: Optional[array] = None
+        self.priors: Optional[array] = None
+        self.children = {}
+
+    @property
+    def expanded(self) -> bool:
+        return self.moves is not None
+
+    # memory held by this node, for the transposition table's budget
+    def size_bytes(self) -> int:
+        if not self.expanded:
+            return NODE_OVERHEAD_BYTES
+
+        return NODE_OVERHEAD_BYTES + sum(
+            sys.getsizeof(column) for column in (self.moves, self.visits, self.wins, self.priors)
+        )
+
+    # enumerate the valid moves from this node, board is this node's board.
+    # moves are stored as placement indices, sorted by prior (highest first).
+    # the node's size in tree's table is updated to include the new arrays
+    def expand(self, board: Board, tree: Optional[Tree] = None) -> None:
+        # no moves once the game has ended on the turn limit
+        placements = Node(None, board, self.color).legal_placements() if board.turns_left() else []
+        scores = placement_priors(board, self.color, placements)
+        order = sorted(range(len(placements)), key=lambda i: scores[i], reverse=True)
+        total = sum(scores)
+        count = len(placements)
+
+        self.moves = array('H', (placements[i].index for i in order))
+        self.visits = array('I', bytes(4 * count))
+        # wins are counted in halves for draws
+        self.wins = array('f', bytes(4 * count))
+        self.priors = array('f', (scores[i] / total for i in order))
+
+        if tree is not None:
+            tree.nodes.resize(self.key, self.size_bytes())
+
+    # number of children (from the start of the arrays) that can be selected
+    def open_children(self) -> int:
+        if not PROGRESSIVE_WIDENING:
+            return len(self.moves)
+
+        widened = int(WIDENING_CONSTANT * self.playouts ** WIDENING_EXPONENT)
+        return min(len(self.moves), max(WIDENING_MIN_CHILDREN, widened))
+
+    def index_of(self, placement: int) -> int:
+        try:
+            return self.moves.index(placement)
+        except ValueError:
+            return -1
+
+    # the child at index, created if this is the first time it has been
+    # descended into. board must already have the child's move played
+    def child(self, index: int, board: Board, tree: Tree) -> 'TreeNode':
+        child = self.children.get(index, None)
+
+        if child is None:
+            child = tree.add_tree_node(board, self.color.opponent, self, index)
+            self.children[index] = child
+        elif child.key not in tree.nodes:
+            # dropped from the table (e.g. by a promote) while still linked
+            tree.nodes.put(child.key, child, child.size_bytes())
+
+        # nodes on the selected path are the last to be evicted
+        tree.nodes.touch(child.key)
+        return child
+
+    def ucb(self, index: int) -> float:
+        visits = self.visits[index]
+
+        if SELECTION_RULE == "puct":
+            value = self.wins[index] / visits if visits else 0.0
+            return (value + BALANCING_CONSTANT * self.priors[index]
+                    * math.sqrt(self.playouts) / (1 + visits))
+
+        if visits == 0:
             return float('inf')
 
-        if not self.parent or self.parent.wins == 0:
-            return self.wins / self.playouts
+        if self.playouts == 0:
+            return self.wins[index] / visits
+
+        return ((self.wins[index] / visits)
+                + BALANCING_CONSTANT * math.sqrt(math.log(self.playouts) / visits))
+
+    # ucb of every child at once, as an array. as for ucb, unvisited children
+    # score infinity with ucb1
+    def ucb_scores(self):
+        visits = np.frombuffer(self.visits, dtype=np.uint32).astype(np.float64)
+        wins = np.frombuffer(self.wins, dtype=np.float32)
+        value = np.divide(wins, visits, out=np.zeros_like(visits), where=visits > 0)
+
+        if SELECTION_RULE == "puct":
+            priors = np.frombuffer(self.priors, dtype=np.float32)
+            return value + BALANCING_CONSTANT * priors * math.sqrt(self.playouts) / (1 + visits)
+
+        scores = value
+
+        if self.playouts > 0:
+            exploration = np.divide(math.log(self.playouts), visits, out=np.zeros_like(visits), where=visits > 0)
+            scores = value + BALANCING_CONSTANT * np.sqrt(exploration)
+
+        scores[visits == 0] = np.inf
+        return scores
+
+    # results are the losers of each playout (None for a draw, worth half a
+    # win to each side). path is the (node, child index) pairs descended
+    # through to reach this node, which a transposition may not share with
+    # its parent pointers
+    def back_propagate(self, path: List[Tuple['TreeNode', int]], results: List[Optional[PlayerColor]]) -> None:
+        playouts = len(results)
+        losses = {color: 0.0 for color in PlayerColor}
 
-        return ((self.wins / self.playouts)
-                + BALANCING_CONSTANT * math.sqrt(math.log(self.parent.wins) / self.playouts))
+        for color in results:
+            if color is None:
+                for either in PlayerColor:
+                    losses[either] += 0.5
+            else:
+                losses[color] += 1
 
-    def back_propagate(self, winning_color: PlayerColor) -> None:
-        self.playouts += 1
+        self.playouts += playouts
 
-        if winning_color == self.node.color:
-            self.wins += 1
+        for tree_node, index in path:
+            tree_node.playouts += playouts
+            tree_node.visits[index] += playouts
+            tree_node.wins[index] += losses[tree_node.color.opponent]
 
-        self.ucb_score = self.ucb()
+    def playout(self, board: Board, pieces: List[TetrominoShape], path: List[Tuple['TreeNode', int]],
+                count: int = PLAYOUTS_PER_LEAF) -> None:
+        if count > 1 and NUMPY_AVAILABLE:
+            results = batch_playout(board, self.color, count)
+        else:
+            node = Node(None, board, self.color)
+            results = [node.playout(pieces) for _ in range(count)]
 
-        if self.parent:
-            self.parent.back_propagate(winning_color)
+        self.back_propagate(path, results)
 
-    def playout(self, pieces: List[TetrominoShape]) -> None:
-        winning_color = self.node.playout(pieces)
-        self.back_propagate(winning_color)
+    # index of the child with the highest ucb, or -1 if there are no moves
+    def select_max_child(self) -> int:
+        if not self.moves:
+            return -1
 
-    def select_max_child(self, pieces: List[TetrominoShape]) -> 'TreeNode':
-        if len(self.children.keys()) == 0:
-            child_nodes = self.node.generate_nodes(pieces)
+        open_children = self.open_children()
 
-            for node in child_nodes:
-                child_node = self.tree.add_tree_node(node, self)
-                self.children[child_node.board_string] = child_node
+        if NUMPY_AVAILABLE:
+            return int(self.ucb_scores()[:open_children].argmax())
 
         max_ucb = float('-inf')
-        max_node = None
+        max_index = -1
 
-        for key in self.children.keys():
-            this_node = self.children[key]
-            ucb = this_node.ucb_score
+        for index in range(open_children):
+            ucb = self.ucb(index)
 
             if ucb == float('inf'):
-                return this_node
+                return index
 
             if ucb > max_ucb:
                 max_ucb = ucb
-                max_node = this_node
+                max_index = index
 
-        return max_node
+        return max_index
 
-    def select_best_move(self) -> 'TreeNode':
-        max_playouts = float('-inf')
-        max_node = None
+    # index of the most visited child, or -1 if there are no moves
+    def select_best_move(self) -> int:
+        max_visits = -1
+        max_index = -1
 
-        for key in self.children.keys():
-            node = self.children[key]
+        for index in range(len(self.moves)):
+            if self.visits[index] > max_visits:
+                max_visits = self.visits[index]
+                max_index = index
 
-            if node.playouts > max_playouts and self.node.board.is_place_valid(node.node.placement, self.node.color):
-                max_playouts = node.playouts
-                max_node = node
+        return max_index
 
-        return max_node
+    def placement(self, index: int) -> Placement:
+        return PLACEMENTS[self.moves[index]]
@@ -0,0 +1,33 @@
+import random
+
+from referee.game.coord import Coord
+from referee.game.player import PlayerColor
+from referee.game.constants import BOARD_N
+
+# fixed seed so every process (and every game) agrees on the keys
+ZOBRIST_SEED = 30024
+
+_random = random.Random(ZOBRIST_SEED)
+
+# one 64 bit key per cell per colour, indexed by [r * BOARD_N + c][color]
+CELL_KEYS = tuple(
+    tuple(_random.getrandbits(64) for _ in PlayerColor)
+    for _ in range(BOARD_N * BOARD_N)
+)
+
+# xor-ed in whenever the side to move changes
+SIDE_KEY = _random.getrandbits(64)
+
+
+def cell_key(coord: Coord, color: PlayerColor) -> int:
+    return CELL_KEYS[coord.r * BOARD_N + coord.c][color.value]
+
+
+# full hash of a board dict, only needed when a board is built from scratch
+def hash_board(board: dict) -> int:
+    board_hash = 0
+
+    for coord, color in board.items():
+        board_hash ^= cell_key(coord, color)
+
+    return board_hash
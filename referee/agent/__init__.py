@@ -1,7 +1,15 @@
 # COMP30024 Artificial Intelligence, Semester 1 2024
 # Project Part B: Game Playing Agent
 
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
 from contextlib import contextmanager
+from functools import partial
+from importlib import import_module
+from traceback import format_exc
 from typing import Type
 
 from ..game.player import Player
@@ -10,11 +18,27 @@ from ..game import Action, PlayerColor, PlayerException
 from ..options import PlayerLoc, TIME_LIMIT_NOVALUE
 from .client import RemoteProcessClassClient, AsyncProcessStatus, \
     WrappedProcessException
-from .resources import ResourceLimitException
+from .pool import AgentProcessPool
+from .resources import ResourceLimitException, CountdownTimer
 
 RECV_TIMEOUT = TIME_LIMIT_NOVALUE # Max seconds for agent to reply (wall clock)
 
 
+def _summarise_status(status: AsyncProcessStatus | None):
+    if status is None:
+        return "resources usage status: unknown\n"
+
+    time_str = f"  time:  +{status.time_delta:6.3f}s  (just elapsed)   "\
+               f"  {status.time_used:7.3f}s  (game total)\n"
+    space_str = ""
+    if status.space_known:
+        space_str = f"  space: {status.space_curr:7.3f}MB (current usage)  "\
+                    f"  {status.space_peak:7.3f}MB (peak usage)\n"
+    else:
+        space_str = "  space: unknown (check platform)\n"
+    return f"resources usage status:\n{time_str}{space_str}"
+
+
 
 class AgentProxyPlayer(Player):
     """
@@ -35,6 +59,7 @@ class AgentProxyPlayer(Player):
         log: LogStream = NullLogger(),
         intercept_exc_type: Type[Exception] = PlayerException,
         subproc_output: bool = True,
+        pool: AgentProcessPool | None = None,
     ):
         '''
         Create an agent proxy player.
@@ -57,6 +82,8 @@ class AgentProxyPlayer(Player):
             caught from the agent process. 
         subproc_output: Whether to print the agent's stderr stream to the
             terminal. This is useful for debugging.
+        pool: Pool of ready agent processes to run the agent in. If None, a
+            new process is started for the agent.
         '''
         super().__init__(color)
 
@@ -72,6 +99,7 @@ class AgentProxyPlayer(Player):
             recv_timeout = RECV_TIMEOUT, 
             subproc_output = subproc_output,
             log = log,
+            pool = pool,
             # Class constructor arguments (passed to agent)
             color = color
         )
@@ -79,6 +107,10 @@ class AgentProxyPlayer(Player):
         self._ret_symbol = f"⤷" if log.setting("unicode") else "->"
         self._InterceptExc = intercept_exc_type
 
+    @property
+    def status(self) -> AsyncProcessStatus | None:
+        return self._agent.status
+
     @contextmanager
     def _intercept_exc(self):
         try:
@@ -89,7 +121,7 @@ class AgentProxyPlayer(Player):
         except ResourceLimitException as e:
             self._log.error(f"resource limit exceeded (pid={self._agent.pid}): {str(e)}")
             self._log.error("\n")
-            self._log.error(self._summarise_status(self._agent.status))
+            self._log.error(_summarise_status(self._agent.status))
             self._log.error("\n")
 
             raise self._InterceptExc(
@@ -142,7 +174,7 @@ class AgentProxyPlayer(Player):
             action: Action = await self._agent.action()
 
         self._log.debug(f"{self._ret_symbol} {action!r}")
-        self._log.debug(self._summarise_status(self._agent.status))
+        self._log.debug(_summarise_status(self._agent.status))
         return action
 
     async def update(self, color: PlayerColor, action: Action):
@@ -154,18 +186,208 @@ class AgentProxyPlayer(Player):
         with self._intercept_exc():
             await self._agent.update(color, action)
 
-        self._log.debug(self._summarise_status(self._agent.status))
-
-    def _summarise_status(self, status: AsyncProcessStatus | None):
-        if status is None:
-            return "resources usage status: unknown\n"
-
-        time_str = f"  time:  +{status.time_delta:6.3f}s  (just elapsed)   "\
-                   f"  {status.time_used:7.3f}s  (game total)\n"
-        space_str = ""
-        if status.space_known:
-            space_str = f"  space: {status.space_curr:7.3f}MB (current usage)  "\
-                        f"  {status.space_peak:7.3f}MB (peak usage)\n"
-        else:
-            space_str = "  space: unknown (check platform)\n"
-        return f"resources usage status:\n{time_str}{space_str}"
+        self._log.debug(_summarise_status(self._agent.status))
+
+
+class _AgentThread(Executor):
+    """
+    Run calls one at a time on a single daemon thread. Unlike the threads of a
+    ThreadPoolExecutor, which are joined when the interpreter exits, a thread
+    stuck in an agent that never returns doesn't keep the referee running.
+    """
+
+    def __init__(self):
+        self._calls: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def _work(self):
+        while (call := self._calls.get()) is not None:
+            future, fn, args, kwargs = call
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        future = Future()
+        self._calls.put((future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._calls.put(None)
+        if wait:
+            self._thread.join()
+
+
+class InProcessAgentPlayer(Player):
+    """
+    Run an Agent class directly in the referee's process, for benchmarking
+    trusted agents without the cost of passing every message to a separate
+    process. Time is accounted for (and limits enforced) as for
+    AgentProxyPlayer, but as the CPU time of the thread the agent runs on.
+    Space can't be told apart from that of the referee and any other agent in
+    the process, so it is reported as unknown and space limits are not
+    enforced. Like AgentProxyPlayer, this class is implemented as an async
+    context manager.
+    """
+
+    def __init__(self, 
+        name: str,
+        color: PlayerColor, 
+        agent_loc: PlayerLoc,
+        time_limit: float | None, 
+        space_limit: float | None, 
+        res_limit_tolerance: float = 1.0,
+        log: LogStream = NullLogger(),
+        intercept_exc_type: Type[Exception] = PlayerException,
+        use_thread: bool = True,
+    ):
+        '''
+        Create an in-process agent player. Arguments are as for
+        AgentProxyPlayer, except:
+
+        use_thread: Whether to call the agent in a worker thread, so that the
+            referee's event loop stays responsive while the agent runs, and
+            an agent that doesn't reply within RECV_TIMEOUT seconds (wall
+            clock) is abandoned. If False, the agent is called directly from
+            the event loop, with no such timeout.
+        '''
+        super().__init__(color)
+
+        assert isinstance(agent_loc, PlayerLoc), "agent_loc must be a PlayerLoc"
+        self._pkg, self._cls = agent_loc
+
+        self._name = name
+        self._time_limit = time_limit or 0
+        self._space_limit = space_limit or 0
+        # Timed by the CPU time of the thread calling the agent, as other
+        # agents (and the referee) run in the same process
+        self._timer = CountdownTimer(
+            self._time_limit, res_limit_tolerance, clock=time.thread_time)
+        self._agent = None
+        self._executor = _AgentThread() if use_thread else None
+        self._log = log
+        if self._space_limit > 0:
+            log.warning("space limit not enforced for agents run in process")
+        self._ret_symbol = f"⤷" if log.setting("unicode") else "->"
+        self._InterceptExc = intercept_exc_type
+
+    @property
+    def status(self) -> AsyncProcessStatus:
+        return AsyncProcessStatus(
+            time_delta=self._timer.delta(),
+            time_used=self._timer.total(),
+            space_known=False,
+            space_curr=-1,
+            space_peak=-1,
+        )
+
+    def _referee(self) -> dict:
+        # Same resource information as given to agents in a subprocess
+        # (with space unknown, as for a subprocess that can't measure it)
+        time_rem = self._time_limit - self._timer.total() \
+            if self._time_limit > 0 else None
+        return {
+            "time_remaining": time_rem,
+            "space_remaining": None,
+            "space_limit": self._space_limit if self._space_limit > 0 else None,
+        }
+
+    def _call_tracked(self, method, *args, **kwargs):
+        with self._timer:
+            return method(*args, **{**kwargs, **self._referee()})
+
+    async def _run(self, fn, *args, **kwargs):
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        try:
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(
+                    self._executor, partial(fn, *args, **kwargs)),
+                timeout=RECV_TIMEOUT
+            )
+        except asyncio.TimeoutError as e:
+            # The agent's thread can't be stopped, but is left behind (it
+            # doesn't stop the referee from exiting, see _AgentThread)
+            self._log.debug(f"reply not received within {RECV_TIMEOUT}s!")
+            raise ResourceLimitException(
+                f"agent reply time limit ({RECV_TIMEOUT}s) exceeded"
+            ) from e
+
+    async def _call(self, method, *args, **kwargs):
+        return await self._run(self._call_tracked, method, *args, **kwargs)
+
+    @contextmanager
+    def _intercept_exc(self):
+        try:
+            yield
+
+        # Reraising exceptions as PlayerExceptions to determine win/loss
+        # outcomes in calling code (see the 'game' module).
+        except ResourceLimitException as e:
+            self._log.error(f"resource limit exceeded: {str(e)}")
+            self._log.error("\n")
+            self._log.error(_summarise_status(self.status))
+            self._log.error("\n")
+
+            raise self._InterceptExc(
+                f"{str(e)} in {self._name} agent",
+                self._color
+            )
+
+        except Exception as e:
+            err_lines = format_exc().splitlines()
+
+            self._log.error(f"exception caught (in process):")
+            self._log.error("\n")
+            self._log.error("\n".join([f">> {line}" for line in err_lines]))
+            self._log.error("\n")
+
+            raise self._InterceptExc(
+                f"error in {self._name} agent\n"
+                f"{self._ret_symbol} {err_lines[-1]}",
+                self._color
+            )
+
+    async def __aenter__(self) -> 'InProcessAgentPlayer':
+        # Import and construct the agent class
+        self._log.debug(f"creating agent in process...")
+        with self._intercept_exc():
+            Cls = getattr(import_module(self._pkg), self._cls)
+            self._agent = await self._call(Cls, color=self._color)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._agent = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._log.debug(f"agent released")
+
+    async def action(self) -> Action:
+        """
+        Get the agent's action for the current turn.
+        """
+        assert self._agent is not None
+        self._log.debug(f"call 'action()'...")
+
+        with self._intercept_exc():
+            action: Action = await self._call(self._agent.action)
+
+        self._log.debug(f"{self._ret_symbol} {action!r}")
+        self._log.debug(_summarise_status(self.status))
+        return action
+
+    async def update(self, color: PlayerColor, action: Action):
+        """
+        Update the agent with the latest action from the game.
+        """
+        assert self._agent is not None
+        self._log.debug(f"call 'update({color!r}, {action!r})'...")
+
+        with self._intercept_exc():
+            await self._call(self._agent.update, color, action)
+
+        self._log.debug(_summarise_status(self.status))
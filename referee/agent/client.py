@@ -2,15 +2,18 @@
 # Project Part B: Game Playing Agent
 
 import sys
-from asyncio import subprocess, wait_for
+from asyncio import subprocess, wait_for, IncompleteReadError
 from asyncio.subprocess import create_subprocess_exec, Process
 from asyncio.exceptions import TimeoutError as AIOTimeoutError
 from typing import Any
 
 from ..log import NullLogger, LogStream
 from .resources import ResourceLimitException
-from .io import AsyncProcessStatus, m_pickle, m_unpickle,\
-    _SUBPROC_MODULE, _ACK, _REPLY_OK, _REPLY_EXC, _CHUNK_LIMIT_KB
+from .io import AsyncProcessStatus, m_pickle, m_unpickle, m_frame, \
+    m_unframe, _SUBPROC_MODULE, _ACK, _REPLY_OK, _REPLY_EXC, \
+    _CHUNK_LIMIT_KB, _PROTOCOL_LINE, _PROTOCOL_COMPACT, _FRAMED_PROTOCOLS, \
+    _FRAME_HEADER, _POOL_CHECKOUT, _POOL_RELEASE
+from .pool import AgentProcessPool
 
 class WrappedProcessException(Exception):
     pass
@@ -18,6 +21,8 @@ class WrappedProcessException(Exception):
 # Context manager that wraps a class in a separate "sandbox" process. The class
 # is instantiated in the subprocess, and all calls to methods are forwarded to
 # the subprocess. Exceptions are also forwarded back to the parent process. 
+# Given a pool, the class is instead instantiated in a ready worker checked out
+# from the pool, which is handed back at the end (see pool module).
 
 class RemoteProcessClassClient:
 
@@ -29,6 +34,8 @@ class RemoteProcessClassClient:
         subproc_output: bool,
         *cons_args, 
         log: LogStream=NullLogger(),
+        protocol: str=_PROTOCOL_COMPACT,
+        pool: AgentProcessPool | None=None,
         **cons_kwargs
     ):
         self._pkg = pkg
@@ -44,6 +51,13 @@ class RemoteProcessClassClient:
         self._proc: Process | None = None
         self._status: AsyncProcessStatus | None = None
         self._killed: bool = False
+        # Transport requested from the subprocess, and the one in use (the
+        # line transport until the subprocess acknowledges, see io module)
+        self._requested_protocol = protocol
+        self._protocol = _PROTOCOL_LINE
+        self._pool = pool
+        # Whether the process can host another game (pooled workers only)
+        self._reusable = True
 
     @property
     def pid(self) -> int:
@@ -54,6 +68,37 @@ class RemoteProcessClassClient:
     def status(self) -> AsyncProcessStatus | None:
         return self._status
 
+    async def _read_message(self) -> Any:
+        assert self._proc is not None
+        assert self._proc.stdout is not None
+
+        if self._protocol in _FRAMED_PROTOCOLS:
+            try:
+                header = await self._proc.stdout.readexactly(
+                    _FRAME_HEADER.size)
+                (size,) = _FRAME_HEADER.unpack(header)
+                return m_unframe(
+                    await self._proc.stdout.readexactly(size),
+                    self._protocol == _PROTOCOL_COMPACT
+                )
+            except IncompleteReadError as e:
+                raise EOFError("expected result, got EOF") from e
+
+        line = await self._proc.stdout.readline()
+        if not line:
+            raise EOFError("expected result, got EOF")
+        return m_unpickle(line)
+
+    def _write_message(self, o: Any):
+        assert self._proc is not None
+        assert self._proc.stdin is not None
+
+        if self._protocol in _FRAMED_PROTOCOLS:
+            self._proc.stdin.write(
+                m_frame(o, self._protocol == _PROTOCOL_COMPACT))
+        else:
+            self._proc.stdin.write(m_pickle(o))
+
     async def _recv_reply(self):
         assert self._proc is not None
         assert self._proc.stdout is not None
@@ -61,8 +106,8 @@ class RemoteProcessClassClient:
         self._log.debug(
             f"waiting for reply from subprocess {self._proc.pid} (stdout)")
         try:
-            line = await wait_for(
-                self._proc.stdout.readline(),
+            reply = await wait_for(
+                self._read_message(),
                 timeout=self._recv_timeout
             )
         except AIOTimeoutError as e:
@@ -75,10 +120,7 @@ class RemoteProcessClassClient:
                 f"({self._recv_timeout}s) exceeded"
             ) from e
 
-        if not line:
-            raise EOFError("expected result, got EOF")
-
-        return await self._process_reply(m_unpickle(line))
+        return await self._process_reply(reply)
 
     async def _process_reply(self, reply: tuple[Any, ...]):
         assert self._proc is not None
@@ -87,6 +129,7 @@ class RemoteProcessClassClient:
         self._status = status
         match args:
             case (_REPLY_EXC, ResourceLimitException() as e, _):
+                self._reusable = False
                 raise e
             case (_REPLY_EXC, Exception() as e, stacktrace_str):
                 raise WrappedProcessException(
@@ -119,25 +162,45 @@ class RemoteProcessClassClient:
         await self._proc.wait()
         self._killed = True
 
-    async def __aenter__(self):
+    def _spec(self) -> tuple[Any, ...]:
+        return (
+            self._pkg, self._cls,
+            self._time_limit, self._space_limit,
+            self._res_limit_tolerance,
+            self._cons_args, 
+            self._cons_kwargs
+        )
+
+    async def _start_process(self):
         # Start subprocess
         self._proc = await create_subprocess_exec(
             sys.executable, "-m", _SUBPROC_MODULE,
-            m_pickle((
-                self._pkg, self._cls,
-                self._time_limit, self._space_limit,
-                self._res_limit_tolerance,
-                self._cons_args, 
-                self._cons_kwargs
-            )),
+            m_pickle(self._spec()),
+            self._requested_protocol,
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.DEVNULL if not self._subproc_output else None,
             limit = _CHUNK_LIMIT_KB * 1000
         )
         assert self._proc is not None
-        assert self._proc.stdin is not None
         self._log.debug(f"subprocess {self._proc.pid} started")
+
+    async def _checkout_process(self):
+        # Take a ready worker from the pool, and ask it to construct the class
+        # using the pool's transport
+        assert self._pool is not None
+        self._proc = await self._pool.checkout()
+        self._protocol = self._pool.protocol
+        self._log.debug(f"pooled subprocess {self._proc.pid} checked out")
+        self._write_message((_POOL_CHECKOUT, self._spec(), {}))
+
+    async def __aenter__(self):
+        if self._pool is not None:
+            await self._checkout_process()
+        else:
+            await self._start_process()
+        assert self._proc is not None
+        assert self._proc.stdin is not None
         
         # Expect ack that constructor was called
         try:
@@ -145,16 +208,45 @@ class RemoteProcessClassClient:
                 f"initialising class '{self._pkg}:{self._cls}' "
                 f"on subprocess {self._proc.pid}"
             )
-            assert await self._recv_reply() == _ACK
+            ack = await self._recv_reply()
+            if ack == _ACK:
+                # Subprocess doesn't negotiate, so uses the line transport
+                self._protocol = _PROTOCOL_LINE
+            elif isinstance(ack, tuple) and len(ack) == 2 and ack[0] == _ACK:
+                self._protocol = ack[1]
+            else:
+                raise ValueError(f"unexpected acknowledgement: {ack}")
+            self._log.debug(
+                f"subprocess {self._proc.pid} using {self._protocol} transport")
         except:
             # Exception during construction occured
             self._log.debug(
                 f"exception occured during construction of class"
             )
-            await self._graceful_exit()
+            await self._end_process(failed=True)
             raise
         return self
 
+    async def _end_process(self, failed: bool):
+        assert self._proc is not None
+
+        if self._pool is None:
+            if not self._killed:
+                await self._graceful_exit()
+            return
+
+        # A pooled worker goes back to the pool if the game ended cleanly,
+        # otherwise it is replaced by a fresh one
+        if not failed and not self._killed and self._reusable:
+            try:
+                self._write_message((_POOL_RELEASE, (), {}))
+                if await self._recv_reply() == _ACK:
+                    self._pool.release(self._proc)
+                    return
+            except Exception as e:
+                self._log.debug(f"pooled subprocess not released: {e}")
+        await self._pool.retire(self._proc)
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         assert self._proc is not None
         assert self._proc.stdin is not None
@@ -162,9 +254,9 @@ class RemoteProcessClassClient:
         if exc_type is not None:
             self._log.debug(f"an exception occured!")
 
-        if not self._killed:
-            # Gracefully end process by writing EOF to stdin
-            await self._graceful_exit()
+        await self._end_process(failed=exc_type is not None)
+        if self._pool is not None:
+            return
 
         # Check for errors
         if self._proc.returncode != 0 and not self._killed:
@@ -186,7 +278,7 @@ class RemoteProcessClassClient:
                 f"send method call request to subprocess "
                 f"{self._proc.pid} (stdin)"
             )
-            self._proc.stdin.write(m_pickle((name, args, kwargs)))
+            self._write_message((name, args, kwargs))
             return await self._recv_reply()
 
         return call
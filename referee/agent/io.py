@@ -4,10 +4,15 @@
 import binascii
 from contextlib import contextmanager
 import pickle
+import struct
 from dataclasses import dataclass
 from binascii import b2a_base64, a2b_base64
 from typing import Any
 
+from ..game import PlaceAction, PlayerColor, Coord
+from ..game.constants import BOARD_N
+from ..game.bitboard import CELL_COORDS
+
 
 _SUBPROC_MODULE = "referee.agent.subprocess"
 _ACK = "ACK"
@@ -15,6 +20,40 @@ _REPLY_OK = b"OK"
 _REPLY_EXC = b"EXC"
 _CHUNK_LIMIT_KB = 1024
 
+# Pooled subprocesses (see pool module) are started with a spec of
+# (_POOL_WORKER, modules to import), and each game they host is bracketed by
+# method calls with these names
+_POOL_WORKER = "POOL"
+_POOL_CHECKOUT = "__checkout__"
+_POOL_RELEASE = "__release__"
+
+# Message transports between the referee and agent subprocesses. Messages are
+# either base64 encoded pickles terminated by a newline ("line"), or raw
+# pickles preceded by their length ("framed"), or preceded by their length
+# and using the compact encoding below for the most common messages
+# ("compact"). The transport is negotiated when the subprocess starts: the
+# client asks for one as a command line argument, and the subprocess
+# acknowledges with the one it will use. The acknowledgement itself is always
+# sent using the line transport.
+_PROTOCOL_LINE = "line"
+_PROTOCOL_FRAMED = "framed"
+_PROTOCOL_COMPACT = "compact"
+_PROTOCOLS = (_PROTOCOL_LINE, _PROTOCOL_FRAMED, _PROTOCOL_COMPACT)
+_FRAMED_PROTOCOLS = (_PROTOCOL_FRAMED, _PROTOCOL_COMPACT)
+_FRAME_HEADER = struct.Struct("!I")
+
+# Compact encoding: a one byte tag followed by a fixed layout. A place action
+# is its four cell indices (r * BOARD_N + c, in order), a colour is its value
+# and a status is packed as below. Anything else is pickled.
+_TAG_PICKLE = b"P"
+_TAG_ACTION_CALL = b"A"         # ("action", (), {})
+_TAG_UPDATE_CALL = b"U"         # ("update", (color, action), {})
+_TAG_ACTION_REPLY = b"a"        # (status, _REPLY_OK, action)
+_TAG_NONE_REPLY = b"n"          # (status, _REPLY_OK, None)
+_ACTION_LAYOUT = struct.Struct("!4B")
+_UPDATE_LAYOUT = struct.Struct("!B4B")
+_STATUS_LAYOUT = struct.Struct("!dd?dd")
+
 
 class InterchangeException(Exception):
     pass
@@ -33,7 +72,7 @@ class AsyncProcessStatus:
 def catch_exceptions(op: str, data: Any):
     try:
         yield
-    except pickle.PicklingError as e:
+    except (pickle.PicklingError, pickle.UnpicklingError) as e:
         raise InterchangeException(
             f"cannot {op} object: {data}") from e
     except binascii.Error as e:
@@ -47,3 +86,84 @@ def m_pickle(o: Any) -> bytes:
 def m_unpickle(b: bytes) -> Any:
     with catch_exceptions("unpickle", b):
         return pickle.loads(a2b_base64(b))
+
+def m_frame(o: Any, compact: bool=False) -> bytes:
+    if compact:
+        payload = m_encode(o)
+    else:
+        with catch_exceptions("pickle", o):
+            payload = pickle.dumps(o, protocol=pickle.HIGHEST_PROTOCOL)
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+def m_unframe(payload: bytes, compact: bool=False) -> Any:
+    if compact:
+        return m_decode(payload)
+    with catch_exceptions("unpickle", payload):
+        return pickle.loads(payload)
+
+
+def _action_cells(action: Any) -> tuple[int, ...] | None:
+    # Only well formed actions are encoded, so that the referee sees exactly
+    # what the agent returned in every other case
+    if type(action) != PlaceAction:
+        return None
+    try:
+        coords = (action.c1, action.c2, action.c3, action.c4)
+    except AttributeError:
+        return None
+    if not all(type(coord) == Coord for coord in coords):
+        return None
+    return tuple(coord.r * BOARD_N + coord.c for coord in coords)
+
+def _pack_status(status: AsyncProcessStatus) -> bytes:
+    return _STATUS_LAYOUT.pack(
+        status.time_delta, status.time_used, status.space_known,
+        status.space_curr, status.space_peak)
+
+def _unpack_status(payload: bytes) -> AsyncProcessStatus:
+    return AsyncProcessStatus(*_STATUS_LAYOUT.unpack_from(payload, 1))
+
+def m_encode(o: Any) -> bytes:
+    match o:
+        # A mapping pattern matches any dict, so keyword arguments (which the
+        # compact tags can't carry) must be ruled out by the guards
+        case ("action", (), kwargs) if not kwargs:
+            return _TAG_ACTION_CALL
+        case ("update", (PlayerColor() as color, action), kwargs) \
+                if not kwargs:
+            cells = _action_cells(action)
+            if cells is not None:
+                return _TAG_UPDATE_CALL + _UPDATE_LAYOUT.pack(
+                    color.value, *cells)
+        case (AsyncProcessStatus() as status, reply, result) \
+                if reply == _REPLY_OK:
+            if result is None:
+                return _TAG_NONE_REPLY + _pack_status(status)
+            cells = _action_cells(result)
+            if cells is not None:
+                return _TAG_ACTION_REPLY + _pack_status(status) \
+                    + _ACTION_LAYOUT.pack(*cells)
+    with catch_exceptions("pickle", o):
+        return _TAG_PICKLE + pickle.dumps(o, protocol=pickle.HIGHEST_PROTOCOL)
+
+def m_decode(payload: bytes) -> Any:
+    tag = payload[:1]
+    if tag == _TAG_ACTION_CALL:
+        return ("action", (), {})
+    if tag == _TAG_UPDATE_CALL:
+        color, *cells = _UPDATE_LAYOUT.unpack_from(payload, 1)
+        return ("update", (
+            PlayerColor(color),
+            PlaceAction(*(CELL_COORDS[cell] for cell in cells))
+        ), {})
+    if tag == _TAG_NONE_REPLY:
+        return (_unpack_status(payload), _REPLY_OK, None)
+    if tag == _TAG_ACTION_REPLY:
+        cells = _ACTION_LAYOUT.unpack_from(
+            payload, 1 + _STATUS_LAYOUT.size)
+        return (_unpack_status(payload), _REPLY_OK,
+            PlaceAction(*(CELL_COORDS[cell] for cell in cells)))
+    if tag == _TAG_PICKLE:
+        with catch_exceptions("unpickle", payload):
+            return pickle.loads(payload[1:])
+    raise InterchangeException(f"unknown message tag: {tag!r}")
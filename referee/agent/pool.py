@@ -0,0 +1,146 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+import asyncio
+import sys
+from asyncio import subprocess
+from asyncio.subprocess import create_subprocess_exec, Process
+
+from ..log import NullLogger, LogStream
+from .io import m_pickle, m_unpickle, _SUBPROC_MODULE, _ACK, _REPLY_OK, \
+    _CHUNK_LIMIT_KB, _PROTOCOL_COMPACT, _POOL_WORKER
+
+# Pool of "warm" agent subprocesses. Each worker is started ahead of time with
+# the referee (and optionally some agent packages) already imported, and can
+# then host any number of games one after the other. A RemoteProcessClassClient
+# given a pool checks out a worker instead of starting a new process, and hands
+# it back at the end of the game (see client module).
+
+class AgentProcessPool:
+
+    def __init__(self,
+        size: int,
+        preload: list[str] = [],
+        subproc_output: bool = False,
+        *,
+        log: LogStream = NullLogger(),
+        protocol: str = _PROTOCOL_COMPACT,
+    ):
+        """
+        Create a pool of `size` worker processes (started on entering the
+        pool's context). `preload` lists modules for each worker to import
+        before it is ready, e.g. the agent packages to be played. Workers
+        communicate with the transport `protocol` (see io module).
+        """
+        self._size = size
+        self._preload = list(preload)
+        self._subproc_output = subproc_output
+        self._log = log
+        self._protocol = protocol
+        self._ready: asyncio.Queue[Process] = asyncio.Queue()
+        self._procs: set[Process] = set()
+        self._spawning: set[asyncio.Task] = set()
+        self._closed = False
+
+    @property
+    def protocol(self) -> str:
+        return self._protocol
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    async def _spawn(self) -> Process:
+        proc = await create_subprocess_exec(
+            sys.executable, "-m", _SUBPROC_MODULE,
+            m_pickle((_POOL_WORKER, self._preload)),
+            self._protocol,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL if not self._subproc_output else None,
+            limit = _CHUNK_LIMIT_KB * 1000
+        )
+        assert proc.stdout is not None
+        self._procs.add(proc)
+
+        # Worker acknowledges (over the line transport) once it's ready
+        line = await proc.stdout.readline()
+        if not line:
+            await self._discard(proc)
+            raise RuntimeError("pool worker exited before it was ready")
+        _, reply, ack = m_unpickle(line)
+        if reply != _REPLY_OK or ack != (_ACK, self._protocol):
+            await self._discard(proc)
+            raise RuntimeError(f"unexpected reply from pool worker: {ack}")
+
+        self._log.debug(f"pool worker {proc.pid} ready")
+        return proc
+
+    async def _replenish(self):
+        proc = await self._spawn()
+        if self._closed:
+            await self._discard(proc)
+        else:
+            self._ready.put_nowait(proc)
+
+    def _start_replacement(self):
+        task = asyncio.create_task(self._replenish())
+        self._spawning.add(task)
+        task.add_done_callback(self._spawning.discard)
+
+    async def _discard(self, proc: Process):
+        # Gracefully end the worker by writing EOF to stdin
+        self._procs.discard(proc)
+        if proc.returncode is None:
+            assert proc.stdin is not None
+            try:
+                proc.stdin.write_eof()
+            except (BrokenPipeError, ConnectionResetError):
+                proc.kill()
+        await proc.wait()
+
+    async def checkout(self) -> Process:
+        """
+        Take a ready worker from the pool, waiting for one to be free (or
+        started) if none is.
+        """
+        assert not self._closed, "pool is closed"
+        proc = await self._ready.get()
+        self._log.debug(f"pool worker {proc.pid} checked out")
+        return proc
+
+    def release(self, proc: Process):
+        """
+        Return a worker that has finished hosting a game to the pool.
+        """
+        if self._closed or proc.returncode is not None:
+            self._procs.discard(proc)
+            return
+        self._log.debug(f"pool worker {proc.pid} released")
+        self._ready.put_nowait(proc)
+
+    async def retire(self, proc: Process):
+        """
+        End a worker that can't be reused (e.g. it was killed, or exceeded a
+        resource limit), starting another in its place.
+        """
+        self._log.debug(f"pool worker {proc.pid} retired")
+        await self._discard(proc)
+        if not self._closed:
+            self._start_replacement()
+
+    async def __aenter__(self) -> 'AgentProcessPool':
+        self._log.debug(f"starting {self._size} pool workers...")
+        procs = await asyncio.gather(
+            *(self._spawn() for _ in range(self._size)))
+        for proc in procs:
+            self._ready.put_nowait(proc)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._closed = True
+        for task in list(self._spawning):
+            task.cancel()
+        await asyncio.gather(*self._spawning, return_exceptions=True)
+        await asyncio.gather(*(self._discard(proc) for proc in list(self._procs)))
+        self._log.debug(f"pool workers terminated")
@@ -14,20 +14,23 @@ class CountdownTimer:
     """
     Reusable context manager for timing specific sections of code
 
-    * measures CPU time, not wall-clock time
+    * measures CPU time, not wall-clock time: by default that of the whole
+      process, or of whichever clock is given (e.g. `time.thread_time`)
     * unless time_limit is 0, throws an exception upon exiting the context
       after the allocated time has passed
     """
 
-    def __init__(self, time_limit, tolerance=1.0):
+    def __init__(self, time_limit, tolerance=1.0, clock=time.process_time):
         """
         Create a new countdown timer with time limit `limit`, in seconds
         (0 for unlimited time). If `tolerance` is specified, the timer will
         allow the process to run for `tolerance` times the specified limit
-        before throwing an exception.
+        before throwing an exception. `clock` is read on entering and exiting
+        the context, so a per-thread clock must be used from a single thread.
         """
         self._limit = time_limit
         self._tolerance = tolerance
+        self._time = clock
         self._clock = 0
         self._delta = 0
 
@@ -41,12 +44,12 @@ class CountdownTimer:
         # clean up memory off the clock
         gc.collect()
         # then start timing
-        self.start = time.process_time()
+        self.start = self._time()
         return self  # unused
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         # accumulate elapsed time since __enter__
-        elapsed = time.process_time() - self.start
+        elapsed = self._time() - self.start
         self._clock += elapsed
         self._delta = elapsed
 
@@ -66,6 +69,8 @@ class MemoryWatcher:
     * works by parsing procfs; only available on linux.
     * unless the limit is set to 0, throws an exception upon exiting the
       context if the memory limit has been breached
+    * measures from its own baseline (see set_space_line), so that several
+      watchers in one process don't reset each other's measurements
     """
 
     def __init__(self, space_limit, tolerance=1.0):
@@ -73,6 +78,9 @@ class MemoryWatcher:
         self._tolerance = tolerance
         self._curr_usage = -1
         self._peak_usage = -1
+        self._base_usage = 0
+        self._base_peak = 0
+        self._enabled = False
 
     def curr(self):
         return self._curr_usage
@@ -81,7 +89,28 @@ class MemoryWatcher:
         return self._peak_usage
 
     def enabled(self):
-        return _SPACE_ENABLED
+        return self._enabled
+
+    def base_usage(self):
+        return self._base_usage
+
+    def set_space_line(self, base_usage: float | None = None):
+        """
+        by default, the python interpreter uses a significant amount of space
+        measure this first to later subtract from this watcher's measurements.
+        if `base_usage` is given it is subtracted instead (e.g. the usage of a
+        pooled worker before it hosted any game, so that memory it still holds
+        from earlier games is not hidden in the baseline); growth is then
+        measured from the process's current peak.
+        """
+        try:
+            usage, self._base_peak = _get_space_usage()
+            self._base_usage = usage if base_usage is None else base_usage
+            self._enabled = True
+        except:
+            # this also gives us a chance to detect if our space-measuring
+            # method will work on this platform, and notify the user if not.
+            self._enabled = False
 
     def __enter__(self):
         return self  # unused
@@ -91,13 +120,21 @@ class MemoryWatcher:
         Check up on the current and peak space usage of the process, printing
         stats and ensuring that peak usage is not exceeding limits
         """
-        if _SPACE_ENABLED:
-            self._curr_usage, self._peak_usage = _get_space_usage()
+        if self._enabled:
+            self._curr_usage, peak_usage = _get_space_usage()
+
+            # the process peak includes whatever ran before the baseline was
+            # measured (e.g. earlier games hosted by the same pooled process),
+            # so until it is exceeded use the highest usage seen here
+            if peak_usage <= self._base_peak:
+                peak_usage = max(self._curr_usage, 
+                                 self._peak_usage + self._base_usage)
+            self._peak_usage = peak_usage
 
             # adjust measurements to reflect usage of agents and referee, not
             # the Python interpreter itself
-            self._curr_usage -= _DEFAULT_MEM_USAGE
-            self._peak_usage -= _DEFAULT_MEM_USAGE
+            self._curr_usage -= self._base_usage
+            self._peak_usage -= self._base_usage
 
             # if we are limited, let's hope we are not out of space!
             if self._limit is not None and self._limit > 0:
@@ -122,23 +159,3 @@ def _get_space_usage():
                 peak_usage = int(line.split()[1]) / 1024  # kB -> MB
     return curr_usage, peak_usage # type: ignore
 
-
-_DEFAULT_MEM_USAGE = 0
-
-_SPACE_ENABLED = False
-
-
-def set_space_line():
-    """
-    by default, the python interpreter uses a significant amount of space
-    measure this first to later subtract from all measurements
-    """
-    global _SPACE_ENABLED, _DEFAULT_MEM_USAGE
-
-    try:
-        _DEFAULT_MEM_USAGE, _ = _get_space_usage()
-        _SPACE_ENABLED = True
-    except:
-        # this also gives us a chance to detect if our space-measuring method
-        # will work on this platform, and notify the user if not.
-        _SPACE_ENABLED = False
@@ -1,6 +1,7 @@
 # COMP30024 Artificial Intelligence, Semester 1 2024
 # Project Part B: Game Playing Agent
 
+import gc
 import sys
 from contextlib import contextmanager
 from importlib import import_module
@@ -8,9 +9,11 @@ from importlib.util import find_spec
 from traceback import format_exc
 from typing import Any
 
-from .resources import CountdownTimer, MemoryWatcher, set_space_line
-from .io import AsyncProcessStatus, m_pickle, m_unpickle,\
-    _ACK, _REPLY_OK, _REPLY_EXC
+from .resources import CountdownTimer, MemoryWatcher
+from .io import AsyncProcessStatus, m_pickle, m_unpickle, m_frame, \
+    m_unframe, _ACK, _REPLY_OK, _REPLY_EXC, _PROTOCOL_LINE, \
+    _PROTOCOL_COMPACT, _PROTOCOLS, _FRAMED_PROTOCOLS, _FRAME_HEADER, \
+    _POOL_WORKER, _POOL_CHECKOUT, _POOL_RELEASE
 
 _STDOUT_OVERRIDE_MESSAGE = "stdout usage is not allowed in agent (use stderr)"
 _STDIN_OVERRIDE_MESSAGE = "stdin usage is not allowed in agent"
@@ -56,26 +59,22 @@ def main():
     def _s_unpickle(s: str) -> Any:
         return m_unpickle(bytes(s, "ascii"))
 
-    def _s_pickle(o: Any) -> str:
-        return m_pickle(o).decode("ascii")
-    
-    def _is_pickleable(o: Any) -> bool:
-        try:
-            m_pickle(o)
-            return True
-        except Exception:
-            return False
-
-    # Command line arguments are the class/constructor arguments
-    cls_module, cls_name, \
-        time_limit, space_limit, \
-        res_limit_tolerance, \
-        cons_args, cons_kwargs \
-        = _s_unpickle(sys.argv[1])
-
-    # Create some context managers for resource tracking
-    timer = CountdownTimer(time_limit, res_limit_tolerance)
-    space = MemoryWatcher(space_limit, res_limit_tolerance)
+    # Command line arguments are the class/constructor arguments (or, for a
+    # pooled worker, the modules to import in advance), optionally followed by
+    # the transport requested by the client (see io module)
+    spec = _s_unpickle(sys.argv[1])
+    pooled = spec[0] == _POOL_WORKER
+    protocol = sys.argv[2] if len(sys.argv) > 2 else _PROTOCOL_LINE
+    if protocol not in _PROTOCOLS:
+        protocol = _PROTOCOL_LINE
+    framed = protocol in _FRAMED_PROTOCOLS
+    compact = protocol == _PROTOCOL_COMPACT
+
+    # Resource tracking for the game being played, replaced for each game
+    # hosted by a pooled worker
+    time_limit = space_limit = 0
+    timer = CountdownTimer(0)
+    space = MemoryWatcher(0)
 
     def _get_status():
         return AsyncProcessStatus(
@@ -100,49 +99,118 @@ def main():
 
     # Comms functions
     def _recv() -> Any:
+        if framed:
+            header = in_stream.buffer.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size: # EOF, process should exit
+                exit(0)
+            (size,) = _FRAME_HEADER.unpack(header)
+            return m_unframe(in_stream.buffer.read(size), compact)
+
         line = in_stream.readline()
         if not line: # EOF, process should exit (see __aexit__ above)
             exit(0)
         return _s_unpickle(line)
 
-    def _reply(*args: Any):
-        # Reply is a tuple of (status, arg0, arg1, ...)
-        out_stream.write(_s_pickle((_get_status(), *args)))
-        out_stream.flush()
+    def _serialise(reply: tuple, handshake: bool) -> bytes:
+        if framed and not handshake:
+            return m_frame(reply, compact)
+        return m_pickle(reply)
+
+    def _reply(*args: Any, handshake: bool=False):
+        # Reply is a tuple of (status, arg0, arg1, ...). It is serialised
+        # once, and a successful result that can't be serialised is replaced
+        # with a placeholder
+        reply = (_get_status(), *args)
+        try:
+            data = _serialise(reply, handshake)
+        except Exception:
+            if args[0] != _REPLY_OK:
+                raise
+            data = _serialise(
+                (reply[0], _REPLY_OK, "<unpickleable>"), handshake)
+        out_stream.buffer.write(data)
+        out_stream.buffer.flush()
 
     @contextmanager
-    def _relay_exceptions():
+    def _relay_exceptions(handshake: bool=False):
         try:
             yield
         except Exception as e:
             stacktrace_str = "\n".join(format_exc().splitlines()[5:])
-            _reply(_REPLY_EXC, e, stacktrace_str)
+            _reply(_REPLY_EXC, e, stacktrace_str, handshake=handshake)
 
     # If numpy exists on system, ensure it's imported so that it is included
     # in baseline memory usage calculations
-    if find_spec("numpy") is not None and cls_name != "MockClient":
+    if find_spec("numpy") is not None and spec[1] != "MockClient":
         import numpy
 
-    # Construct class instance
-    with _relay_exceptions(), timer, space:
-        set_space_line()
-        Cls = getattr(import_module(cls_module), cls_name)
-        instance = Cls(*cons_args, **{**cons_kwargs, **_referee()})
-    _reply(_REPLY_OK, _ACK)
+    # A pooled worker imports the agent modules it was given ahead of time,
+    # then tells the pool it is ready and waits to be checked out. Each game
+    # then starts with a checkout message carrying the class/constructor
+    # arguments, and ends with a release message. Memory use in every game is
+    # measured from the worker's usage before these imports, as it would be
+    # in a fresh process, so that memory kept from earlier games (e.g. in
+    # the allocator's arenas, or in module level caches) still counts
+    worker_space = MemoryWatcher(0)
+    if pooled:
+        worker_space.set_space_line()
+        for module in spec[1]:
+            import_module(module)
+        _reply(_REPLY_OK, (_ACK, protocol), handshake=True)
 
-    # Main client subprocess loop
     while True:
-        message = _recv()
-        name, args, kwargs = message
-        
-        # Call method
-        result = None
-        with _relay_exceptions(), timer, space:
-            result = getattr(instance, name)(*args, **{**kwargs, **_referee()})
-            if not _is_pickleable(result):
-                result = "<unpickleable>"
-        
-        _reply(_REPLY_OK, result)
+        if pooled:
+            name, args, _ = _recv()
+            if name != _POOL_CHECKOUT:
+                _reply(_REPLY_EXC, ValueError(
+                    f"expected checkout, got {name!r}"), "")
+                continue
+            spec = args
+
+        cls_module, cls_name, \
+            time_limit, space_limit, \
+            res_limit_tolerance, \
+            cons_args, cons_kwargs \
+            = spec
+
+        # Fresh resource tracking for this game
+        timer = CountdownTimer(time_limit, res_limit_tolerance)
+        space = MemoryWatcher(space_limit, res_limit_tolerance)
+        instance = None
+
+        # Construct class instance, then acknowledge (with the transport used
+        # for all messages that follow when it is the first message sent)
+        with _relay_exceptions(handshake=not pooled), timer, space:
+            space.set_space_line(
+                worker_space.base_usage() if pooled else None)
+            Cls = getattr(import_module(cls_module), cls_name)
+            instance = Cls(*cons_args, **{**cons_kwargs, **_referee()})
+        if instance is not None:
+            _reply(_REPLY_OK, (_ACK, protocol), handshake=not pooled)
+
+        # Main client subprocess loop, until the game releases the worker
+        while instance is not None:
+            message = _recv()
+            name, args, kwargs = message
+
+            if pooled and name == _POOL_RELEASE:
+                instance = None
+                gc.collect()
+                _reply(_REPLY_OK, _ACK)
+                break
+
+            # Call method
+            result = None
+            with _relay_exceptions(), timer, space:
+                result = getattr(instance, name)(
+                    *args, **{**kwargs, **_referee()})
+
+            _reply(_REPLY_OK, result)
+
+        if not pooled:
+            # Constructor failed, wait for the client to end the process
+            while True:
+                _recv()
 
 # Only run if directly invoked
 if __name__ == "__main__" and sys.argv[0].endswith(__file__):
@@ -0,0 +1,78 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Helpers for representing sets of board cells as Python ints ("bitboards").
+# Cell (r, c) is mapped to bit r * BOARD_N + c, so a full board fits in a
+# single BOARD_N * BOARD_N bit integer. Row and column masks are precomputed
+# once at import time so that line checks reduce to a mask comparison.
+
+from typing import Generator
+
+from .constants import BOARD_N
+from .coord import Coord, Direction
+
+
+BOARD_CELLS = BOARD_N * BOARD_N
+FULL_MASK   = (1 << BOARD_CELLS) - 1
+
+CELL_COORDS: tuple[Coord, ...] = tuple(
+    Coord(r, c) for r in range(BOARD_N) for c in range(BOARD_N)
+)
+
+ROW_MASKS: tuple[int, ...] = tuple(
+    ((1 << BOARD_N) - 1) << (r * BOARD_N) for r in range(BOARD_N)
+)
+
+COL_MASKS: tuple[int, ...] = tuple(
+    sum(1 << (r * BOARD_N + c) for r in range(BOARD_N))
+    for c in range(BOARD_N)
+)
+
+
+def cell_index(coord: Coord) -> int:
+    """
+    Return the bit index of a cell on the board.
+    """
+    return coord.r * BOARD_N + coord.c
+
+
+def cell_bit(coord: Coord) -> int:
+    """
+    Return the single-bit mask of a cell on the board.
+    """
+    return 1 << (coord.r * BOARD_N + coord.c)
+
+
+def coords_mask(coords) -> int:
+    """
+    Return the mask covering a collection of cells.
+    """
+    mask = 0
+    for coord in coords:
+        mask |= 1 << (coord.r * BOARD_N + coord.c)
+    return mask
+
+
+def iter_indices(mask: int) -> Generator[int, None, None]:
+    """
+    Yield the bit index of each cell set in the mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def iter_coords(mask: int) -> Generator[Coord, None, None]:
+    """
+    Yield the coordinate of each cell set in the mask.
+    """
+    for index in iter_indices(mask):
+        yield CELL_COORDS[index]
+
+
+# Cells adjacent (with wrapping) to each cell of the board.
+NEIGHBOUR_MASKS: tuple[int, ...] = tuple(
+    coords_mask(coord + direction for direction in Direction)
+    for coord in CELL_COORDS
+)
@@ -3,12 +3,14 @@
 
 from dataclasses import dataclass
 
-from .pieces import Piece, PieceType, create_piece
-from .coord import Coord, Direction
+from .coord import Coord
 from .player import PlayerColor
 from .actions import Action, PlaceAction
 from .exceptions import IllegalActionException
 from .constants import *
+from .bitboard import FULL_MASK, ROW_MASKS, COL_MASKS, NEIGHBOUR_MASKS, \
+    cell_bit, coords_mask, iter_coords, iter_indices
+from .placements import Placement, PLACEMENTS_COVERING, find_placement
 
 
 @dataclass(frozen=True, slots=True)
@@ -61,10 +63,13 @@ class Board:
     """
     A class representing the game board for internal use in the referee. 
 
+    The state of the board is held as two bitboards (one Python int per player
+    colour), where bit `r * BOARD_N + c` is set iff that player has a token at
+    cell (r, c). See the `bitboard` module for the precomputed masks used.
+
     NOTE: Don't assume this class is an "ideal" board representation for your
     own agent; you should think carefully about how to design data structures
     for representing the state of a game with respect to your chosen strategy.
-    This class has not been optimised beyond what is necessary for the referee.
     """
     def __init__(
         self, 
@@ -75,12 +80,21 @@ class Board:
         Create a new board. It is optionally possible to specify an initial
         board state (in practice this is only used for testing).
         """
-        self._state: dict[Coord, CellState] = {
-            Coord(r, c): CellState() 
-            for r in range(BOARD_N) 
-            for c in range(BOARD_N)
-        }
-        self._state.update(initial_state)
+        self._bits: list[int] = [0 for _ in PlayerColor]
+
+        # Number of occupied cells in each row and column, maintained as cells
+        # change (see `_set_cell`) so line clears can be found by count.
+        self._row_counts: list[int] = [0] * BOARD_N
+        self._col_counts: list[int] = [0] * BOARD_N
+
+        for cell, state in initial_state.items():
+            if state.player is not None:
+                self._set_cell(cell, state)
+
+        # Empty cells adjacent to each player's tokens, maintained
+        # incrementally as cells change (see `_update_frontiers`).
+        self._frontier: list[int] = [0 for _ in PlayerColor]
+        self._update_frontiers(self._occupied_mask())
 
         self._turn_color: PlayerColor = initial_player
         self._history: list[BoardMutation] = []
@@ -91,7 +105,11 @@ class Board:
         """
         if not self._within_bounds(cell):
             raise IndexError(f"Cell position '{cell}' is invalid.")
-        return self._state[cell]
+        bit = cell_bit(cell)
+        for color in PlayerColor:
+            if self._bits[color] & bit:
+                return _CELL_STATES[color]
+        return _CELL_EMPTY
 
     def apply_action(self, action: Action) -> BoardMutation:
         """
@@ -106,7 +124,8 @@ class Board:
                     f"Unknown action {action}", self._turn_color)
 
         for cell_mutation in mutation.cell_mutations:
-            self._state[cell_mutation.cell] = cell_mutation.next
+            self._set_cell(cell_mutation.cell, cell_mutation.next)
+        self._update_frontiers(mutation)
         
         self._history.append(mutation)
         self._turn_color = self._turn_color.opponent
@@ -126,7 +145,8 @@ class Board:
         self._turn_color = self._turn_color.opponent
 
         for cell_mutation in mutation.cell_mutations:
-            self._state[cell_mutation.cell] = cell_mutation.prev
+            self._set_cell(cell_mutation.cell, cell_mutation.prev)
+        self._update_frontiers(mutation)
 
         return mutation
 
@@ -148,7 +168,7 @@ class Board:
         for r in range(BOARD_N):
             for c in range(BOARD_N):
                 if self._cell_occupied(Coord(r, c)):
-                    color = self._state[Coord(r, c)].player
+                    color = self[Coord(r, c)].player
                     color = "r" if color == PlayerColor.RED else "b"
                     text = f"{color}"
                     if use_color:
@@ -182,35 +202,36 @@ class Board:
         """
         return self._turn_color
     
+    def has_legal_move(self, color: PlayerColor) -> bool:
+        """
+        True iff the given player can place at least one piece. This query
+        does not mutate the board. Only placements covering a frontier cell
+        (an empty cell next to one of the player's tokens) are considered, and
+        the search stops at the first placement that fits.
+        """
+        occupied = self._occupied_mask()
+        if self.turn_count < 2:
+            # No adjacency requirement applies on the first turn of each
+            # player, so any empty cell can anchor a placement.
+            anchors = ~occupied & FULL_MASK
+        else:
+            anchors = self._frontier[color]
+
+        for index in iter_indices(anchors):
+            for placement in PLACEMENTS_COVERING[index]:
+                if placement.mask & occupied == 0:
+                    return True
+        return False
+
     @property
     def game_over(self) -> bool:
         """
         True iff the game is over.
         """
-        empty_coords = set(filter(self._cell_empty, self._state.keys()))
-
         if self.turn_limit_reached:
             return True
 
-        # Try all possible piece types at all empty coordinates to see if there
-        # are any legal moves remaining. This is quite inefficient, but good
-        # enough for the referee's purposes.
-        for piece_type in PieceType: 
-            for coord in empty_coords:
-                try:
-                    piece_coords = set(create_piece(piece_type, coord).coords)
-
-                    self.apply_action(PlaceAction(*piece_coords))
-                    self.undo_action()
-
-                    # If we got here, there's at least one legal move left.
-                    return False
-                
-                except (ValueError, IllegalActionException):
-                    pass
-
-        # Tried all possible moves and none were legal.
-        return True
+        return not self.has_legal_move(self._turn_color)
     
     @property
     def winner_color(self) -> PlayerColor | None:
@@ -240,17 +261,52 @@ class Board:
         r, c = coord
         return 0 <= r < BOARD_N and 0 <= c < BOARD_N
     
+    def _set_cell(self, coord: Coord, state: CellState):
+        bit = cell_bit(coord)
+        was_occupied = self._occupied_mask() & bit != 0
+        for color in PlayerColor:
+            self._bits[color] &= ~bit
+        if state.player is not None:
+            self._bits[state.player] |= bit
+
+        change = (state.player is not None) - was_occupied
+        if change:
+            self._row_counts[coord.r] += change
+            self._col_counts[coord.c] += change
+
+    def _update_frontiers(self, changed: BoardMutation | int):
+        # A cell's frontier membership only depends on the cell itself and its
+        # neighbours, so only the changed cells and their neighbours need to
+        # be re-examined.
+        if isinstance(changed, BoardMutation):
+            changed = coords_mask(m.cell for m in changed.cell_mutations)
+        region = changed
+        for index in iter_indices(changed):
+            region |= NEIGHBOUR_MASKS[index]
+
+        empty = ~self._occupied_mask()
+        for color in PlayerColor:
+            bits = self._bits[color]
+            frontier = self._frontier[color] & ~region
+            for index in iter_indices(region & empty):
+                if NEIGHBOUR_MASKS[index] & bits:
+                    frontier |= 1 << index
+            self._frontier[color] = frontier
+
     def _cell_occupied(self, coord: Coord) -> bool:
-        return self._state[coord].player != None
+        return self._occupied_mask() & cell_bit(coord) != 0
     
     def _cell_empty(self, coord: Coord) -> bool:
-        return self._state[coord].player == None
+        return self._occupied_mask() & cell_bit(coord) == 0
     
     def _player_token_count(self, color: PlayerColor) -> int:
-        return sum(1 for cell in self._state.values() if cell.player == color)
+        return self._bits[color].bit_count()
     
+    def _occupied_mask(self) -> int:
+        return self._bits[PlayerColor.RED] | self._bits[PlayerColor.BLUE]
+
     def _occupied_coords(self) -> set[Coord]:
-        return set(filter(self._cell_occupied, self._state.keys()))
+        return set(iter_coords(self._occupied_mask()))
     
     def _assert_coord_valid(self, coord: Coord):
         if type(coord) != Coord or not self._within_bounds(coord):
@@ -269,13 +325,10 @@ class Board:
                     self._turn_color)
         
     def _has_neighbour(self, coord: Coord, color: PlayerColor) -> bool:
-        for direction in Direction:
-            neighbour = coord + direction
-            if self._state[neighbour].player == color:
-                return True
-        return False
+        return NEIGHBOUR_MASKS[coord.r * BOARD_N + coord.c] \
+            & self._bits[color] != 0
 
-    def _parse_place_action(self, action: PlaceAction) -> Piece:
+    def _parse_place_action(self, action: PlaceAction) -> Placement:
         if type(action) != PlaceAction:
             raise IllegalActionException(
                 f"Action '{action}' is not a PLACE action object.", 
@@ -298,50 +351,52 @@ class Board:
                 f"No coords in {action} neighbour a {self._turn_color} piece.",
                     self._turn_color)
 
-        try:
-            return Piece(action.coords)
-        except ValueError as e:
-            raise IllegalActionException(str(e), self._turn_color)
+        placement = find_placement(action.coords)
+        if placement is None:
+            raise IllegalActionException(
+                "Coords do not match any known piece type.", self._turn_color)
+        return placement
 
     def _resolve_place_action(self, action: PlaceAction) -> BoardMutation:
         piece = self._parse_place_action(action)
-        coords_with_piece = self._occupied_coords() | set(piece.coords)
 
-        min_r = min(c.r for c in piece.coords)
-        max_r = max(c.r for c in piece.coords)
-        min_c = min(c.c for c in piece.coords)
-        max_c = max(c.c for c in piece.coords)
-        
-        remove_r_coords = [
-            Coord(r, c)
-            for r in range(min_r, max_r + 1)
-            for c in range(BOARD_N)
-            if all(Coord(r, c) in coords_with_piece for c in range(BOARD_N))
-        ]
-
-        remove_c_coords = [
-            Coord(r, c)
-            for r in range(BOARD_N)
-            for c in range(min_c, max_c + 1)
-            if all(Coord(r, c) in coords_with_piece for r in range(BOARD_N))
-        ]
+        # Only the rows and columns the piece touches can have been completed
+        # by this action, so only their fill counts need to be checked.
+        row_counts = dict.fromkeys((c.r for c in piece.coords), 0)
+        col_counts = dict.fromkeys((c.c for c in piece.coords), 0)
+        for coord in piece.coords:
+            row_counts[coord.r] += 1
+            col_counts[coord.c] += 1
+
+        remove_mask = 0
+        for r, placed in row_counts.items():
+            if self._row_counts[r] + placed == BOARD_N:
+                remove_mask |= ROW_MASKS[r]
+        for c, placed in col_counts.items():
+            if self._col_counts[c] + placed == BOARD_N:
+                remove_mask |= COL_MASKS[c]
 
         cell_mutations = {
             cell: CellMutation(
                 cell, 
-                self._state[cell], 
-                CellState(self._turn_color)
+                self[cell], 
+                _CELL_STATES[self._turn_color]
             ) for cell in piece.coords
         }
 
-        for cell in remove_r_coords + remove_c_coords:
+        for cell in iter_coords(remove_mask):
             cell_mutations[cell] = CellMutation(
                 cell, 
-                self._state[cell], 
-                CellState(None)
+                self[cell], 
+                _CELL_EMPTY
             )
 
         return BoardMutation(
             action,
             cell_mutations=set(cell_mutations.values())
         )
+
+
+# Cell states are immutable, so a single instance of each can be shared.
+_CELL_EMPTY = CellState()
+_CELL_STATES = {color: CellState(color) for color in PlayerColor}
@@ -0,0 +1,54 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# The placement table (see the `placements` module) as NumPy matrices, for
+# agents that test every placement on many boards at once. A batch of boards
+# is held as a (boards, cells) 0/1 array; multiplying it by one of these
+# matrices counts, for every board and placement, the cells of interest that
+# the placement includes. NumPy is optional: without it `NUMPY_AVAILABLE` is
+# False and the matrices are None.
+
+from .bitboard import BOARD_CELLS, NEIGHBOUR_MASKS, iter_indices
+from .placements import PLACEMENTS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUMPY_AVAILABLE = np is not None
+
+
+def incidence_matrix(cell_lists: list[list[int]]):
+    """
+    Return the (cells, len(cell_lists)) 0/1 matrix with a 1 where the cell is
+    in the corresponding list.
+    """
+    matrix = np.zeros((BOARD_CELLS, len(cell_lists)), dtype=np.float32)
+    for i, cells in enumerate(cell_lists):
+        matrix[cells, i] = 1
+    return matrix
+
+
+def placement_neighbours() -> list[list[int]]:
+    """
+    Return the cells next to each placement (but not covered by it), in the
+    order of `PLACEMENTS`.
+    """
+    neighbours = []
+    for placement in PLACEMENTS:
+        mask = 0
+        for cell in placement.cells:
+            mask |= NEIGHBOUR_MASKS[cell]
+        neighbours.append(list(iter_indices(mask & ~placement.mask)))
+    return neighbours
+
+
+if NUMPY_AVAILABLE:
+    # Counts, for every placement, the occupied cells it covers (it fits iff
+    # this is 0) and the cells next to it belonging to a player (it may be
+    # played by that player iff this is not 0, after their first turn)
+    COVER_MATRIX = incidence_matrix([list(p.cells) for p in PLACEMENTS])
+    NEIGHBOUR_MATRIX = incidence_matrix(placement_neighbours())
+else:
+    COVER_MATRIX = NEIGHBOUR_MATRIX = None
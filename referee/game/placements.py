@@ -0,0 +1,98 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# A precomputed index of every possible piece placement on the (toroidal) game
+# board: each of the nineteen fixed piece types anchored at each of the board
+# cells. The table is built once at import time, after which generating,
+# validating or identifying a placement is a lookup rather than a series of
+# coordinate additions.
+
+from dataclasses import dataclass
+from typing import Collection
+
+from .constants import BOARD_N
+from .coord import Coord
+from .actions import PlaceAction
+from .pieces import PieceType, _TEMPLATES
+from .bitboard import BOARD_CELLS, CELL_COORDS, coords_mask
+
+
+@dataclass(frozen=True, slots=True)
+class Placement:
+    """
+    A structure representing a single piece placement on the board. The cells
+    covered are available as bit indices, coordinates and a single bitmask
+    (see the `bitboard` module).
+    """
+    index: int
+    piece_type: PieceType
+    origin: Coord
+    cells: tuple[int, ...]
+    coords: tuple[Coord, ...]
+    mask: int
+    action: PlaceAction
+
+    def __str__(self) -> str:
+        return f"Placement({self.piece_type.value}, {self.origin})"
+
+
+def _build_placements() -> tuple[Placement, ...]:
+    placements = []
+    for piece_type in PieceType:
+        for origin in CELL_COORDS:
+            cells = tuple(
+                ((origin.r + offset.r) % BOARD_N) * BOARD_N
+                    + (origin.c + offset.c) % BOARD_N
+                for offset in _TEMPLATES[piece_type]
+            )
+            coords = tuple(CELL_COORDS[cell] for cell in cells)
+            placements.append(Placement(
+                index=len(placements),
+                piece_type=piece_type,
+                origin=origin,
+                cells=cells,
+                coords=coords,
+                mask=coords_mask(coords),
+                action=PlaceAction(*coords),
+            ))
+    return tuple(placements)
+
+
+# All placements, indexed by `piece_index * BOARD_CELLS + cell_index(origin)`
+# where `piece_index` is the position of the piece type in `PieceType`.
+PLACEMENTS: tuple[Placement, ...] = _build_placements()
+
+
+def _build_placements_covering() -> tuple[tuple[Placement, ...], ...]:
+    covering: list[list[Placement]] = [[] for _ in range(BOARD_CELLS)]
+    for p in PLACEMENTS:
+        for cell in p.cells:
+            covering[cell].append(p)
+    return tuple(tuple(placements) for placements in covering)
+
+
+# For each cell (by bit index), every placement covering that cell.
+PLACEMENTS_COVERING = _build_placements_covering()
+
+# Reverse lookup from the set of cells covered to the placement.
+PLACEMENT_BY_MASK: dict[int, Placement] = {p.mask: p for p in PLACEMENTS}
+
+_PIECE_INDEX = {piece_type: i for i, piece_type in enumerate(PieceType)}
+
+
+def placement(piece_type: PieceType, origin: Coord) -> Placement:
+    """
+    Return the placement of the given piece type starting at the given origin.
+    """
+    return PLACEMENTS[
+        _PIECE_INDEX[piece_type] * BOARD_CELLS
+            + origin.r * BOARD_N + origin.c
+    ]
+
+
+def find_placement(coords: Collection[Coord]) -> Placement | None:
+    """
+    Return the placement covering exactly the given cells, or None if the
+    cells do not form a valid piece.
+    """
+    return PLACEMENT_BY_MASK.get(coords_mask(coords))
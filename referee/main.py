@@ -20,7 +20,7 @@ from .game import Player, PlayerColor
 from .log import LogStream, LogColor, LogLevel
 from .run import game_user_wait, run_game, \
     game_commentator, game_event_logger, game_delay, output_board_updates
-from .agent import AgentProxyPlayer
+from .agent import AgentProxyPlayer, InProcessAgentPlayer
 from .options import get_options, PlayerLoc
 
 
@@ -90,7 +90,9 @@ def main(options: Namespace|None=None):
             player_name = f"player {p_num} [{':'.join(player_loc)}]"
 
             rl.info(f"wrapping {player_name} as {player_color}...")
-            p: Player = AgentProxyPlayer(
+            PlayerCls = InProcessAgentPlayer if options.in_process \
+                else AgentProxyPlayer
+            p: Player = PlayerCls(
                 player_name,
                 player_color,
                 player_loc,
@@ -133,6 +133,18 @@ def get_options():
         help="limit on CPU time (float, seconds) for each agent.",
     )
 
+    optionals.add_argument(
+        "-i",
+        "--in-process",
+        dest="in_process",
+        action="store_true",
+        help="run the agents in the referee's own process rather than in "
+        "separate subprocesses. faster, but only for trusted agents: they "
+        "share the referee's memory (so space is not measured, and the "
+        "space limit is not enforced) and can interfere with it. time is "
+        "the CPU time of each agent's thread.",
+    )
+
     verbosity_group = optionals.add_mutually_exclusive_group()
     verbosity_group.add_argument(
         "-d",
@@ -0,0 +1,299 @@
+# COMP30024 Artificial Intelligence, Semester 1 2024
+# Project Part B: Game Playing Agent
+
+# Entry point for playing many games between two agents, for example:
+#
+#   python -m referee.tournament agent mcts -n 100 -t 30 -o results.csv
+#
+# Games are played concurrently (see `run_tournament`), each through
+# `run_game` as for a single game, and a row per game is written to the results
+# file as soon as the game ends.
+
+import argparse
+import asyncio
+import csv
+import os
+import sys
+from pathlib import Path
+from typing import AsyncGenerator
+
+from .game import Player, PlayerColor, TurnEnd, PlayerError
+from .log import LogStream, LogColor, LogLevel
+from .run import run_game
+from .agent import AgentProxyPlayer, InProcessAgentPlayer, AgentProcessPool
+from .options import PackageSpecAction, PlayerLoc, \
+    SPACE_LIMIT_DEFAULT, SPACE_LIMIT_NOVALUE, \
+    TIME_LIMIT_DEFAULT, TIME_LIMIT_NOVALUE
+
+PROGRAM = "referee.tournament"
+DESCRIP = "Play many games between two Agent classes, several at a time."
+
+GAMES_DEFAULT = 10
+OUTPUT_DEFAULT = "tournament.csv"
+
+RESULT_FIELDS = [
+    "game", "red", "blue", "winner", "turns",
+    "red_time", "red_space", "blue_time", "blue_space", "error",
+]
+
+
+def get_options():
+    """Parse and return command-line arguments."""
+
+    parser = argparse.ArgumentParser(prog=PROGRAM, description=DESCRIP)
+    for num in (1, 2):
+        parser.add_argument(
+            f"player{num}_loc",
+            metavar=f"AGENT{num}",
+            action=PackageSpecAction,
+            help=f"location of agent {num}'s Agent class (as for the referee)",
+        )
+    parser.add_argument(
+        "-n",
+        "--games",
+        type=int,
+        default=GAMES_DEFAULT,
+        help="number of games to play (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--alternate",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="swap colours every game, otherwise AGENT1 always plays red "
+        "(default: alternate).",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="most agent processes to run at once, two per game (default: "
+        "number of cores, %(default)s).",
+    )
+    parser.add_argument(
+        "-s",
+        "--space",
+        metavar="space_limit",
+        type=float,
+        nargs="?",
+        default=SPACE_LIMIT_DEFAULT,
+        const=SPACE_LIMIT_NOVALUE,
+        help="limit on memory space (float, MB) for each agent.",
+    )
+    parser.add_argument(
+        "-t",
+        "--time",
+        metavar="time_limit",
+        type=float,
+        nargs="?",
+        default=TIME_LIMIT_DEFAULT,
+        const=TIME_LIMIT_NOVALUE,
+        help="limit on CPU time (float, seconds) for each agent.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=OUTPUT_DEFAULT,
+        help="CSV file to write a row per game to (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-p",
+        "--pool",
+        action="store_true",
+        help="reuse a pool of warm agent processes between games, rather "
+        "than starting new ones for every game.",
+    )
+    parser.add_argument(
+        "-i",
+        "--in-process",
+        dest="in_process",
+        action="store_true",
+        help="run the agents in the tournament's own process (trusted agents "
+        "only). time is the CPU time of each agent's thread, space is not "
+        "measured, and games are played one at a time (the agents share one "
+        "interpreter).",
+    )
+    parser.add_argument(
+        "--agent-output",
+        action="store_true",
+        help="show output printed by the agents (hidden by default).",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="only print the final summary.",
+    )
+    return parser.parse_args()
+
+
+async def game_recorder(record: dict) -> AsyncGenerator:
+    """
+    Intercepts game updates to record the number of turns played and any
+    player error in `record`.
+    """
+    while True:
+        update = yield
+        match update:
+            case TurnEnd(turn_id, _, _):
+                record["turns"] = turn_id
+            case PlayerError(message):
+                record["error"] = message
+
+
+def _resources(player: Player) -> tuple[str, str]:
+    # Total CPU time and peak space used by an agent player, if known
+    status = getattr(player, "status", None)
+    if status is None:
+        return "", ""
+    space = f"{status.space_peak:.1f}" if status.space_known else ""
+    return f"{status.time_used:.3f}", space
+
+
+async def play_game(
+    game_id: int,
+    locs: dict[PlayerColor, PlayerLoc],
+    options: argparse.Namespace,
+    pool: AgentProcessPool | None = None,
+) -> dict:
+    """
+    Play a single game between the agents at `locs`, returning a results row
+    (see RESULT_FIELDS).
+    """
+    players: dict[PlayerColor, Player] = {}
+    for color, loc in locs.items():
+        name = f"{color} [{loc}]"
+        if options.in_process:
+            players[color] = InProcessAgentPlayer(
+                name, color, loc,
+                time_limit=options.time,
+                space_limit=options.space,
+            )
+        else:
+            players[color] = AgentProxyPlayer(
+                name, color, loc,
+                time_limit=options.time,
+                space_limit=options.space,
+                subproc_output=options.agent_output,
+                pool=pool,
+            )
+
+    record = {
+        "game": game_id,
+        "red": str(locs[PlayerColor.RED]),
+        "blue": str(locs[PlayerColor.BLUE]),
+        "turns": 0,
+        "error": "",
+    }
+    try:
+        winner = await run_game(
+            players=list(players.values()),
+            event_handlers=[game_recorder(record)],
+        )
+        record["winner"] = str(locs[winner.color]) if winner else "draw"
+    except Exception as e:
+        # Unhandled error (possibly a referee bug), don't stop the others
+        record["winner"] = "error"
+        record["error"] = f"UNHANDLED: {e!r}"
+
+    for color, player in players.items():
+        prefix = str(color).lower()
+        record[f"{prefix}_time"], record[f"{prefix}_space"] = \
+            _resources(player)
+    return record
+
+
+async def run_tournament(
+    options: argparse.Namespace,
+    log: LogStream,
+) -> list[dict]:
+    """
+    Play `options.games` games, at most `options.jobs` agent processes at a
+    time, writing each result to `options.output` as its game ends.
+    """
+    loc1: PlayerLoc = options.player1_loc
+    loc2: PlayerLoc = options.player2_loc
+
+    # Each game has two live agents
+    concurrency = 1 if options.in_process else max(1, options.jobs // 2)
+    slots = asyncio.Semaphore(concurrency)
+    log.info(f"playing {options.games} games of {loc1} vs {loc2}, "
+             f"{concurrency} at a time")
+
+    output = Path(options.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    results: list[dict] = []
+
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        f.flush()
+
+        async def _game(game_id: int, pool: AgentProcessPool | None):
+            swap = options.alternate and game_id % 2 == 0
+            red, blue = (loc2, loc1) if swap else (loc1, loc2)
+            async with slots:
+                record = await play_game(
+                    game_id,
+                    {PlayerColor.RED: red, PlayerColor.BLUE: blue},
+                    options,
+                    pool,
+                )
+            writer.writerow(record)
+            f.flush()
+            results.append(record)
+            log.info(f"game {game_id}: {record['red']} vs {record['blue']}, "
+                     f"winner {record['winner']} after {record['turns']} "
+                     f"turns ({len(results)}/{options.games} done)")
+
+        async def _games(pool: AgentProcessPool | None = None):
+            await asyncio.gather(
+                *(_game(i, pool) for i in range(1, options.games + 1)))
+
+        if options.pool and not options.in_process:
+            async with AgentProcessPool(
+                2 * concurrency, [loc1.pkg, loc2.pkg], options.agent_output,
+            ) as pool:
+                await _games(pool)
+        else:
+            await _games()
+
+    return results
+
+
+def summarise(results: list[dict], locs: list[PlayerLoc]) -> str:
+    """
+    Summarise tournament results: wins per agent, draws, and errors.
+    """
+    lines = [f"{len(results)} games played"]
+    for loc in dict.fromkeys(map(str, locs)):
+        wins = sum(1 for r in results if r["winner"] == loc)
+        lines.append(f"  {loc}: {wins} wins")
+    draws = sum(1 for r in results if r["winner"] == "draw")
+    errors = sum(1 for r in results if r["error"])
+    lines.append(f"  draws: {draws}")
+    lines.append(f"  games with errors: {errors}")
+    return "\n".join(lines)
+
+
+def main(options: argparse.Namespace | None = None):
+    if options is None:
+        options = get_options()
+    assert options is not None
+
+    LogStream.set_global_setting("level",
+        LogLevel.CRITICAL if options.quiet else LogLevel.INFO)
+    LogStream.set_global_setting("ansi",
+        sys.stdout.isatty() and sys.platform != "win32")
+    tl = LogStream("tournament", LogColor.WHITE)
+
+    results = asyncio.run(run_tournament(options, tl))
+
+    tl.critical(summarise(
+        results, [options.player1_loc, options.player2_loc]))
+    tl.critical(f"results written to '{options.output}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+# The greedy agent, plus a CACHE_MB cache built the first time the agent is
+# constructed in a process and kept for later games (as a module level cache
+# or a warm allocator would be).
+
+from . import greedy
+
+CACHE_MB = 40
+
+_cache = None
+
+
+class Agent(greedy.Agent):
+    def __init__(self, color, **referee):
+        global _cache
+
+        super().__init__(color, **referee)
+        if _cache is None:
+            _cache = bytearray(CACHE_MB * 1024 * 1024)
+        self.cache = _cache
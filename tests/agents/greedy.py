@@ -0,0 +1,19 @@
+# A quick agent for playing whole games in tests: it plays a random legal
+# placement every turn.
+
+import random
+
+from agent.board_utils import Board
+
+
+class Agent:
+    def __init__(self, color, **referee):
+        self.color = color
+        self.board = Board({})
+        self.rng = random.Random(color.value)
+
+    def action(self, **referee):
+        return self.rng.choice(self.board.legal_placements(self.color)).action
+
+    def update(self, color, action, **referee):
+        self.board.push(action, color)
@@ -0,0 +1,12 @@
+# An agent whose actions can't be sent back to the referee, and whose updates
+# fail.
+
+class Agent:
+    def __init__(self, color, **referee):
+        pass
+
+    def action(self, **referee):
+        return lambda: None
+
+    def update(self, color, action, **referee):
+        raise ValueError("update failed")
@@ -0,0 +1,102 @@
+# Tests of the message transports between the referee and agent subprocesses
+# (referee.agent.io): every transport must give back exactly the messages the
+# original line transport does.
+
+import asyncio
+
+import pytest
+
+from referee.agent.client import RemoteProcessClassClient, \
+    WrappedProcessException
+from referee.agent.io import AsyncProcessStatus, m_pickle, m_unpickle, \
+    m_frame, m_unframe, m_encode, _FRAME_HEADER, _REPLY_OK, _REPLY_EXC, _ACK, \
+    _POOL_CHECKOUT, _POOL_RELEASE
+from referee.game import PlayerColor, PlaceAction, Coord
+
+ACTION = PlaceAction(Coord(0, 0), Coord(0, 1), Coord(0, 2), Coord(0, 3))
+WRAPPED = PlaceAction(Coord(10, 10), Coord(10, 0), Coord(0, 10), Coord(0, 0))
+STATUS = AsyncProcessStatus(0.25, 12.5, True, 30.0, 31.5)
+NO_SPACE = AsyncProcessStatus(0.0, 0.0, False, -1, -1)
+
+MESSAGES = [
+    # Calls from the referee
+    ("action", (), {}),
+    ("update", (PlayerColor.RED, ACTION), {}),
+    ("update", (PlayerColor.BLUE, WRAPPED), {}),
+    ("action", (), {"time_remaining": 12.5}),
+    ("update", (PlayerColor.RED, ACTION), {"space_remaining": None}),
+    ("update", (PlayerColor.RED, "not an action"), {}),
+    ("update", (PlayerColor.RED, PlaceAction(Coord(0, 0), Coord(0, 1), Coord(0, 2), (0, 3))), {}),
+    (_POOL_CHECKOUT, ("agent.program", "Agent", 1.0, 2.0, 1.0, (), {}), {}),
+    (_POOL_RELEASE, (), {}),
+    # Replies from the agent
+    (STATUS, _REPLY_OK, ACTION),
+    (NO_SPACE, _REPLY_OK, WRAPPED),
+    (STATUS, _REPLY_OK, None),
+    (STATUS, _REPLY_OK, "<unpickleable>"),
+    (STATUS, _REPLY_OK, (_ACK, "line")),
+    (STATUS, _REPLY_EXC, ValueError("boom"), "stack trace"),
+]
+
+TRANSPORTS = ["framed", "compact"]
+
+
+def line_round_trip(message):
+    return m_unpickle(m_pickle(message))
+
+
+def framed_round_trip(message, compact: bool):
+    frame = m_frame(message, compact)
+    (size,) = _FRAME_HEADER.unpack(frame[:_FRAME_HEADER.size])
+    assert size == len(frame) - _FRAME_HEADER.size
+    return m_unframe(frame[_FRAME_HEADER.size:], compact)
+
+
+def same(a, b) -> bool:
+    # Exceptions don't compare equal to their copies
+    if isinstance(a, Exception):
+        return type(a) == type(b) and a.args == b.args
+    if isinstance(a, tuple) and isinstance(b, tuple):
+        return len(a) == len(b) and all(map(same, a, b))
+    return a == b and type(a) == type(b)
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+@pytest.mark.parametrize("message", MESSAGES, ids=repr)
+def test_round_trip_matches_line_transport(transport, message):
+    expected = line_round_trip(message)
+    assert same(expected, message)
+    assert same(framed_round_trip(message, transport == "compact"), expected)
+
+
+@pytest.mark.parametrize("message, tag", [
+    (("action", (), {}), b"A"),
+    (("update", (PlayerColor.BLUE, WRAPPED), {}), b"U"),
+    ((STATUS, _REPLY_OK, ACTION), b"a"),
+    ((STATUS, _REPLY_OK, None), b"n"),
+    # Anything the compact layouts can't hold exactly is pickled
+    (("action", (), {"time_remaining": 12.5}), b"P"),
+    (("update", (PlayerColor.RED, ACTION), {"space_remaining": None}), b"P"),
+    (("update", (PlayerColor.RED, "not an action"), {}), b"P"),
+    ((STATUS, _REPLY_EXC, ValueError("boom"), "stack trace"), b"P"),
+], ids=repr)
+def test_compact_encoding(message, tag):
+    assert m_encode(message)[:1] == tag
+
+
+async def call_unpickleable_agent(protocol: str):
+    client = RemoteProcessClassClient(
+        "tests.agents.unpickleable", "Agent", 0, 0, 1.0, 60, False,
+        protocol=protocol, color=PlayerColor.RED)
+    async with client:
+        result = await client.action()
+        with pytest.raises(WrappedProcessException, match="update failed"):
+            await client.update(PlayerColor.RED, ACTION)
+    return result
+
+
+@pytest.mark.parametrize("protocol", ["line"] + TRANSPORTS)
+def test_unpickleable_result(protocol):
+    # A result that can't be serialised is replaced when replying, while
+    # errors are still relayed
+    assert asyncio.run(call_unpickleable_agent(protocol)) == "<unpickleable>"
@@ -0,0 +1,85 @@
+# Tests that the batched NumPy evaluator (agent.batch_evaluation) scores
+# positions exactly as the one-at-a-time evaluator (agent.evaluation.evaluate).
+
+import random
+
+import pytest
+
+from agent import batch_evaluation, evaluation
+from agent.board_utils import Board
+from referee.game import PlayerColor, Coord
+from referee.game.constants import BOARD_N
+
+pytestmark = pytest.mark.skipif(
+    not batch_evaluation.NUMPY_AVAILABLE, reason="needs numpy")
+
+
+def random_filled_board(rng: random.Random) -> Board:
+    # Tokens scattered at random, from nearly empty to nearly full (where
+    # often neither player can move)
+    density = rng.random()
+    return Board({
+        Coord(r, c): rng.choice(list(PlayerColor))
+        for r in range(BOARD_N) for c in range(BOARD_N)
+        if rng.random() < density
+    })
+
+
+def random_played_board(rng: random.Random) -> Board:
+    # A position reached by random play, so with the shapes (and line clears)
+    # of real games
+    board = Board({})
+    color = PlayerColor.RED
+    for _ in range(rng.randrange(60)):
+        placements = board.legal_placements(color)
+        if not placements:
+            break
+        board.push(rng.choice(placements).action, color)
+        color = color.opponent
+    return board
+
+
+def random_boards(seed: int, count: int) -> list[Board]:
+    rng = random.Random(seed)
+    return [
+        random_filled_board(rng) if i % 2 else random_played_board(rng)
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(params=["default", "all"])
+def features(request, monkeypatch):
+    # The default weights, and every feature weighted (including those off
+    # by default) so that each is compared
+    if request.param == "all":
+        weighted = [(name, feature, 1.0) for name, feature, _
+                    in evaluation.FEATURES]
+        monkeypatch.setattr(evaluation, "FEATURES", weighted)
+        monkeypatch.setattr(batch_evaluation, "FEATURES", weighted)
+    return request.param
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("color", list(PlayerColor))
+def test_evaluate_boards(features, seed, color):
+    boards = random_boards(seed, 60)
+    scores = batch_evaluation.evaluate_boards(boards, color)
+    for board, score in zip(boards, scores):
+        assert score == pytest.approx(evaluation.evaluate(board, color))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_evaluate_children(features, seed):
+    rng = random.Random(seed)
+    for _ in range(5):
+        board = random_played_board(rng)
+        color = rng.choice(list(PlayerColor))
+        placements = board.legal_placements(color)
+        if not placements:
+            continue
+        scores = batch_evaluation.evaluate_children(board, color, placements)
+        for placement, score in zip(placements, scores):
+            board.push(placement.action, color)
+            assert score == pytest.approx(
+                evaluation.evaluate(board, color.opponent))
+            board.pop()
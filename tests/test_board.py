@@ -0,0 +1,157 @@
+# Differential tests of the bitboard game board (referee.game.board) against
+# the original dict based board (see reference_board). Both boards are given
+# the same random games, and must agree on every cell, on which actions are
+# legal, and on how the game ends.
+
+import random
+
+import pytest
+
+from referee.game import PlayerColor, PlaceAction, Coord, IllegalActionException
+from referee.game.board import Board, CellState
+from referee.game.coord import Direction
+from referee.game.pieces import PieceType, create_piece
+from referee.game.constants import BOARD_N
+from referee.game.placements import PLACEMENTS
+
+from .reference_board import ReferenceBoard
+
+GAMES = 20
+SEEDS = range(GAMES)
+
+
+def assert_same_cells(board: Board, reference: ReferenceBoard):
+    for r in range(BOARD_N):
+        for c in range(BOARD_N):
+            assert board[Coord(r, c)] == reference[Coord(r, c)], (r, c)
+
+
+def try_action(board, action) -> bool:
+    try:
+        board.apply_action(action)
+        return True
+    except IllegalActionException:
+        return False
+
+
+def play_random_game(seed: int):
+    """
+    Play a random game on both boards, yielding them after every action
+    (and after some undone actions). Placements are tried in a random order
+    until one is legal, and every placement tried must be legal on both
+    boards or on neither.
+    """
+    rng = random.Random(seed)
+    board = Board()
+    reference = ReferenceBoard()
+    yield board, reference
+
+    while not reference.game_over:
+        placements = list(PLACEMENTS)
+        rng.shuffle(placements)
+        for placement in placements:
+            legal = try_action(reference, placement.action)
+            assert try_action(board, placement.action) == legal, placement
+            if legal:
+                break
+        yield board, reference
+
+        if rng.random() < 0.1:
+            assert board.undo_action().cell_mutations \
+                == reference.undo_action().cell_mutations
+            yield board, reference
+            board.apply_action(placement.action)
+            reference.apply_action(placement.action)
+            yield board, reference
+
+
+def reference_has_legal_move(reference: ReferenceBoard, color: PlayerColor) -> bool:
+    """
+    Whether `color` could place any piece, trying every piece type at every
+    empty cell as the original board's game_over did.
+    """
+    for piece_type in PieceType:
+        for r in range(BOARD_N):
+            for c in range(BOARD_N):
+                coords = create_piece(piece_type, Coord(r, c)).coords
+                if any(reference[coord].player is not None for coord in coords):
+                    continue
+                if reference.turn_count < 2 or any(
+                    reference[coord + direction].player == color
+                    for coord in coords for direction in Direction
+                ):
+                    return True
+    return False
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_random_games(seed):
+    for board, reference in play_random_game(seed):
+        assert_same_cells(board, reference)
+        assert board.turn_count == reference.turn_count
+        assert board.turn_color == reference.turn_color
+        assert board.game_over == reference.game_over
+        assert board.winner_color == reference.winner_color
+        for color in PlayerColor:
+            assert board._player_token_count(color) \
+                == reference._player_token_count(color)
+
+
+def test_line_clears_with_initial_state():
+    # Row 5 filled except for (5, 0)..(5, 3), and column 0 filled except for
+    # (5, 0), so that a single placement clears both
+    state = {Coord(5, c): CellState(PlayerColor.BLUE) for c in range(4, BOARD_N)}
+    state |= {Coord(r, 0): CellState(PlayerColor.RED) for r in range(BOARD_N) if r != 5}
+    board = Board(state)
+    reference = ReferenceBoard(state)
+
+    # Fill (5, 0)..(5, 3), completing row 5 and column 0
+    action = PlaceAction(Coord(5, 0), Coord(5, 1), Coord(5, 2), Coord(5, 3))
+    assert board.apply_action(action).cell_mutations \
+        == reference.apply_action(action).cell_mutations
+    assert_same_cells(board, reference)
+    assert all(board[Coord(5, c)].player is None for c in range(BOARD_N))
+    assert all(board[Coord(r, 0)].player is None for r in range(BOARD_N))
+
+
+@pytest.mark.parametrize("action", [
+    PlaceAction(Coord(0, 0), Coord(0, 1), Coord(0, 2), Coord(1, 2)),
+    PlaceAction(Coord(0, 0), Coord(0, 1), Coord(0, 2), Coord(0, 4)),
+    PlaceAction(Coord(0, 0), Coord(0, 0), Coord(0, 1), Coord(0, 2)),
+    PlaceAction(Coord(0, 10), Coord(0, 0), Coord(0, 1), Coord(0, 2)),
+    "not an action",
+])
+def test_first_actions(action):
+    # Legality of a first action (valid shapes, invalid shapes, wrapping)
+    legal = try_action(ReferenceBoard(), action)
+    assert try_action(Board(), action) == legal
+
+
+@pytest.mark.parametrize("seed", SEEDS[:5])
+def test_has_legal_move(seed):
+    # The frontier kept by the board must give the same answer as searching
+    # every placement, for both players (not only the one to move)
+    for board, reference in play_random_game(seed):
+        for color in PlayerColor:
+            assert board.has_legal_move(color) \
+                == reference_has_legal_move(reference, color)
+
+
+def test_has_legal_move_blocked():
+    # Red's only token is boxed in by blue, so only blue can move
+    state = {Coord(5, 5): CellState(PlayerColor.RED)}
+    for direction in Direction:
+        state[Coord(5, 5) + direction] = CellState(PlayerColor.BLUE)
+    board = Board(state)
+    reference = ReferenceBoard(state)
+    # Past the first turns, where placements need not touch the player's
+    # tokens (turn_count is the length of the history)
+    for _ in range(2):
+        board._history.append(None)
+        reference._history.append(None)
+
+    for color in PlayerColor:
+        assert board.has_legal_move(color) \
+            == reference_has_legal_move(reference, color)
+    assert not board.has_legal_move(PlayerColor.RED)
+    assert board.game_over and board.winner_color == PlayerColor.BLUE
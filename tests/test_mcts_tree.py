@@ -0,0 +1,147 @@
+# Tests of the MCTS search tree (mcts.tree): eviction from the bounded
+# transposition table, and child selection.
+
+import random
+from array import array
+from collections import namedtuple
+
+import pytest
+
+from mcts import tree as tree_module
+from mcts.tree import Tree, TreeNode
+from referee.game import PlayerColor
+
+# Only the hash of a board is used to add nodes to the tree
+HashedBoard = namedtuple("HashedBoard", "hash")
+
+
+def add_child(tree: Tree, parent: TreeNode, index: int, key: int) -> TreeNode:
+    child = tree.add_tree_node(HashedBoard(key), parent.color.opponent, parent, index)
+    parent.children[index] = child
+    return child
+
+
+def reachable(tree: Tree) -> dict:
+    nodes = {tree.root.key: tree.root}
+    stack = [tree.root]
+    while stack:
+        for child in stack.pop().children.values():
+            if child.key not in nodes:
+                nodes[child.key] = child
+                stack.append(child)
+    return nodes
+
+
+def evict(tree: Tree, node: TreeNode) -> bool:
+    # Evict node as the table would if it were the least recently used
+    tree.nodes.entries.move_to_end(node.key, last=False)
+    return tree.nodes.evict()
+
+
+def assert_table_matches_tree(tree: Tree):
+    # Every node the table counts is in the tree and vice versa, so the
+    # table's size is that of the live tree
+    nodes = reachable(tree)
+    assert set(tree.nodes.entries) == set(nodes)
+    assert all(tree.nodes.entries[key] is node for key, node in nodes.items())
+    assert tree.nodes.size == sum(tree.nodes.sizes.values())
+
+
+def build_transposition_tree():
+    # root -> a -> c -> x -> y and root -> b -> d -> x, so x is reached from
+    # both c and d
+    tree = Tree()
+    root = tree.set_root(HashedBoard(1), PlayerColor.RED)
+    a = add_child(tree, root, 0, 2)
+    b = add_child(tree, root, 1, 3)
+    c = add_child(tree, a, 0, 4)
+    d = add_child(tree, b, 0, 5)
+    x = add_child(tree, c, 0, 6)
+    assert add_child(tree, d, 3, 6) is x
+    y = add_child(tree, x, 0, 7)
+    return tree, c, d, x, y
+
+
+def test_transposition_has_every_parent():
+    _, c, d, x, _ = build_transposition_tree()
+    assert x.parents == [(c, 0), (d, 3)]
+
+
+def test_evict_keeps_nodes_linked_elsewhere():
+    tree, c, d, x, y = build_transposition_tree()
+
+    assert evict(tree, c)
+
+    # x is still reachable through d, so it stays (with y) in the table
+    assert x.parents == [(d, 3)]
+    assert x.key in tree.nodes and y.key in tree.nodes
+    assert_table_matches_tree(tree)
+
+
+def test_evict_unlinks_every_parent():
+    tree, c, d, x, y = build_transposition_tree()
+
+    # x must be unlinked from both of its parents, and y (only reachable
+    # through x) dropped with it
+    assert evict(tree, x)
+
+    assert 0 not in c.children and 3 not in d.children
+    assert x.parents == [] and x.children == {} and y.parents == []
+    assert y.key not in tree.nodes
+    assert_table_matches_tree(tree)
+
+
+def test_root_and_children_are_kept():
+    tree, *_ = build_transposition_tree()
+    assert not evict(tree, tree.root)
+    assert all(not evict(tree, child) for child in list(tree.root.children.values()))
+    assert_table_matches_tree(tree)
+
+
+def test_bounded_table_stays_consistent():
+    # A table too small for the tree evicts as nodes are added. Nodes are
+    # added on random paths down from the root (as by the search), with keys
+    # drawn from a small range per depth so that many are transpositions
+    rng = random.Random(0)
+    tree = Tree(space_limit=0.05)
+    root = tree.set_root(HashedBoard(0), PlayerColor.RED)
+    for _ in range(500):
+        node = root
+        for depth in range(1, rng.randint(2, 8)):
+            key = depth * 100 + rng.randrange(30)
+            node = node.child(rng.randrange(4), HashedBoard(key), tree)
+    assert tree.nodes.evictions > 0
+    assert tree.nodes.size <= tree.nodes.capacity
+    assert_table_matches_tree(tree)
+
+
+def random_expanded_node(rng: random.Random, children: int, playouts: int) -> TreeNode:
+    node = TreeNode(0, PlayerColor.RED, None)
+    visits = [rng.choice([0, 0, 1, 2, rng.randrange(100)]) for _ in range(children)]
+    node.moves = array('H', range(children))
+    node.visits = array('I', visits)
+    node.wins = array('f', (rng.randrange(2 * v + 1) / 2 for v in visits))
+    node.priors = array('f', (rng.random() for _ in range(children)))
+    node.playouts = playouts
+    return node
+
+
+@pytest.mark.parametrize("rule", ["ucb1", "puct"])
+@pytest.mark.parametrize("playouts", [0, 1, 2, 50, 1000])
+def test_vectorised_selection_matches_scalar(monkeypatch, rule, playouts):
+    # ucb_scores must agree with ucb for every child, and selection with and
+    # without numpy must pick the same child, including when log(playouts)
+    # is 0 and children are unvisited
+    monkeypatch.setattr(tree_module, "SELECTION_RULE", rule)
+    monkeypatch.setattr(tree_module, "PROGRESSIVE_WIDENING", False)
+    rng = random.Random(playouts)
+    for _ in range(50):
+        node = random_expanded_node(rng, rng.randint(1, 30), playouts)
+        scores = node.ucb_scores()
+        for index in range(len(node.moves)):
+            assert scores[index] == pytest.approx(node.ucb(index), rel=1e-6)
+
+        vectorised = node.select_max_child()
+        monkeypatch.setattr(tree_module, "NUMPY_AVAILABLE", False)
+        assert node.select_max_child() == vectorised
+        monkeypatch.setattr(tree_module, "NUMPY_AVAILABLE", True)
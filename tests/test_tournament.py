@@ -0,0 +1,166 @@
+# Smoke tests of the tournament runner (referee.tournament), playing whole
+# games between the quick test agents (see tests/agents) and checking the
+# results and the resources recorded for each agent.
+
+import argparse
+import asyncio
+import csv
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import referee.agent
+from referee.log import LogStream, LogLevel
+from referee.options import PlayerLoc, SPACE_LIMIT_DEFAULT
+from referee.tournament import run_tournament, summarise, RESULT_FIELDS
+
+from .agents.cached import CACHE_MB
+
+GREEDY = PlayerLoc("tests.agents.greedy", "Agent")
+CACHED = PlayerLoc("tests.agents.cached", "Agent")
+HANGING = PlayerLoc("tests.agents.hanging", "Agent")
+UNPICKLEABLE = PlayerLoc("tests.agents.unpickleable", "Agent")
+
+ROOT = Path(__file__).parent.parent
+
+
+def play(tmp_path, **overrides) -> list[dict]:
+    options = argparse.Namespace(
+        player1_loc=GREEDY,
+        player2_loc=CACHED,
+        games=4,
+        alternate=True,
+        jobs=2,
+        space=SPACE_LIMIT_DEFAULT,
+        time=60,
+        output=tmp_path / "results.csv",
+        pool=False,
+        in_process=False,
+        agent_output=False,
+        quiet=True,
+    )
+    for key, value in overrides.items():
+        setattr(options, key, value)
+
+    LogStream.set_global_setting("level", LogLevel.CRITICAL)
+    results = asyncio.run(
+        run_tournament(options, LogStream("tournament")))
+
+    # Every game is written to the results file as well
+    with open(options.output, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == len(results) == options.games
+    assert set(rows[0]) == set(RESULT_FIELDS)
+    return results
+
+
+def player_field(record: dict, loc: PlayerLoc, field: str) -> str:
+    color = "red" if record["red"] == str(loc) else "blue"
+    return record[f"{color}_{field}"]
+
+
+def cached_space(record: dict) -> str:
+    return player_field(record, CACHED, "space")
+
+
+def test_pooled_games_count_memory_kept_by_the_worker(tmp_path):
+    # With one game at a time on a pool of two workers, every game after the
+    # first reuses workers that already built the cached agent's cache. It
+    # must still be counted, as it would be in a fresh process
+    results = play(tmp_path, pool=True)
+    for record in results:
+        assert not record["error"], record
+        assert float(cached_space(record)) >= CACHE_MB, record
+
+
+def test_pooled_games_enforce_space_limit(tmp_path):
+    # The cached agent exceeds the limit in every game, not only in those
+    # on fresh workers
+    results = play(tmp_path, pool=True, space=CACHE_MB / 2)
+    for record in results:
+        assert record["winner"] == str(GREEDY), record
+        assert "space limit" in record["error"], record
+
+
+def test_in_process_games(tmp_path):
+    # Each agent is timed on its own thread, and space can't be measured per
+    # agent in a shared process (nor limited), so it is left blank
+    results = play(tmp_path, in_process=True, space=CACHE_MB / 2)
+    for record in results:
+        assert not record["error"], record
+        assert record["winner"] in (str(GREEDY), str(CACHED)), record
+        for loc in (GREEDY, CACHED):
+            assert float(player_field(record, loc, "time")) >= 0, record
+            assert player_field(record, loc, "space") == "", record
+
+
+def test_in_process_agent_that_never_replies(tmp_path, monkeypatch):
+    # The hanging agent is abandoned after the reply timeout, and loses
+    monkeypatch.setattr(referee.agent, "RECV_TIMEOUT", 0.5)
+    results = play(tmp_path, in_process=True, player2_loc=HANGING, games=2)
+    for record in results:
+        assert record["winner"] == str(GREEDY), record
+        assert "reply time limit" in record["error"], record
+
+
+@pytest.mark.parametrize("alternate", [True, False])
+def test_games_in_fresh_processes(tmp_path, alternate):
+    results = play(tmp_path, alternate=alternate)
+    assert sorted(record["game"] for record in results) == [1, 2, 3, 4]
+    for record in results:
+        assert not record["error"], record
+        assert record["turns"] > 0, record
+        assert record["winner"] in (str(GREEDY), str(CACHED)), record
+        # AGENT1 plays red in odd games, and in every game if not alternating
+        swapped = alternate and record["game"] % 2 == 0
+        assert record["red"] == str(CACHED if swapped else GREEDY), record
+        for loc in (GREEDY, CACHED):
+            assert float(player_field(record, loc, "time")) >= 0, record
+            space = player_field(record, loc, "space")
+            assert space == "" or float(space) >= 0, record
+
+
+def test_agent_errors_are_recorded(tmp_path):
+    # The unpickleable agent's actions reach the referee as strings, so it
+    # loses every game
+    results = play(tmp_path, player2_loc=UNPICKLEABLE, games=2)
+    for record in results:
+        assert record["winner"] == str(GREEDY), record
+        assert record["error"], record
+
+    summary = summarise(results, [GREEDY, UNPICKLEABLE])
+    assert f"{GREEDY}: 2 wins" in summary
+    assert f"{UNPICKLEABLE}: 0 wins" in summary
+    assert "games with errors: 2" in summary
+
+
+def test_summarise():
+    results = [
+        {"winner": str(GREEDY), "error": ""},
+        {"winner": str(CACHED), "error": ""},
+        {"winner": str(GREEDY), "error": "error in agent"},
+        {"winner": "draw", "error": ""},
+    ]
+    assert summarise(results, [GREEDY, CACHED]).splitlines() == [
+        "4 games played",
+        f"  {GREEDY}: 2 wins",
+        f"  {CACHED}: 1 wins",
+        "  draws: 1",
+        "  games with errors: 1",
+    ]
+
+
+def test_command_line(tmp_path):
+    output = tmp_path / "results.csv"
+    result = subprocess.run(
+        [sys.executable, "-m", "referee.tournament",
+         str(GREEDY), str(CACHED), "-n", "2", "-j", "2", "-q",
+         "-o", str(output)],
+        cwd=ROOT, capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "2 games played" in result.stdout
+    with open(output, newline="") as f:
+        assert len(list(csv.DictReader(f))) == 2